@@ -0,0 +1,72 @@
+"""Measures the time it takes to load the definitions, broken down by top-level package.
+
+The definitions are loaded in a fresh interpreter with `python -X importtime`, which reports the
+time spent importing every module. The self time of each module is summed by top-level package,
+so a heavy dependency imported at module level by a definitions module stands out. Run from the
+project root:
+
+    python benchmarks/import_time.py --runs 3
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# `import time:     self [us] |  cumulative | imported package`
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def load_definitions(module: str) -> tuple[float, dict[str, float]]:
+    """Loads the definitions of `module` in a fresh interpreter.
+
+    Returns:
+        seconds (float): The wall-clock time of the interpreter loading the definitions.
+        packages (dict): The import time in seconds of each top-level package.
+    """
+    command = [
+        sys.executable,
+        "-X",
+        "importtime",
+        "-c",
+        f"from {module} import defs; defs()",
+    ]
+
+    start = time.perf_counter()
+    process = subprocess.run(command, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+
+    packages = defaultdict(float)
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, _, _, name = match.groups()
+            packages[name.split(".")[0]] += int(self_us) / 1e6
+    return seconds, packages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="dagster_and_dbt.definitions")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # The first run also compiles bytecode, keep the fastest run
+    seconds, packages = min(
+        (load_definitions(args.module) for _ in range(args.runs)),
+        key=lambda run: run[0],
+    )
+
+    print(f"Loaded {args.module} in {seconds:.2f}s, best of {args.runs} run(s)")
+    print(f"{'package':<24}{'import time (s)':>16}")
+    for name, package_seconds in sorted(
+        packages.items(), key=lambda item: item[1], reverse=True
+    )[: args.top]:
+        print(f"{name:<24}{package_seconds:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
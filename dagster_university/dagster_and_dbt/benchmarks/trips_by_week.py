@@ -0,0 +1,92 @@
+"""Compares the in-memory and in-database aggregation paths of `trips_by_week`.
+
+A month of synthetic trips is written to a temporary DuckDB database, then every week of the
+month is aggregated with both paths. Run from the project root:
+
+    python benchmarks/trips_by_week.py --num-trips 3000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import duckdb
+import pandas as pd
+
+from dagster_and_dbt.defs.assets.metrics import (
+    aggregate_trips_by_week_in_database,
+    aggregate_trips_by_week_in_memory,
+)
+
+WEEKS = ["2023-01-01", "2023-01-08", "2023-01-15", "2023-01-22", "2023-01-29"]
+
+
+def create_trips(conn: duckdb.DuckDBPyConnection, num_trips: int) -> None:
+    """Creates a `trips` table with `num_trips` trips spread over January 2023."""
+    step_microseconds = 31 * 24 * 3600 * 1_000_000 // num_trips
+    conn.execute(f"""
+        create table trips as
+        select
+            (i % 2 + 1)::integer as vendor_id,
+            (i % 263 + 1)::integer as pickup_zone_id,
+            (i * 7 % 263 + 1)::integer as dropoff_zone_id,
+            1.0 as rate_code_id,
+            1 as payment_type,
+            pickup_datetime + interval 15 minute as dropoff_datetime,
+            pickup_datetime,
+            (i % 100) / 10.0 as trip_distance,
+            (i % 4 + 1)::double as passenger_count,
+            (i % 5000) / 100.0 as total_amount,
+            '2023-01' as partition_date
+        from (
+            select
+                i,
+                timestamp '2023-01-01'
+                    + to_microseconds(i::bigint * {step_microseconds}) as pickup_datetime
+            from range({num_trips}) as t(i)
+        )
+    """)
+
+
+def run(aggregate, conn: duckdb.DuckDBPyConnection) -> tuple[pd.DataFrame, float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = pd.concat([aggregate(conn, week) for week in WEEKS], ignore_index=True)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num-trips", type=int, default=3_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = duckdb.connect(os.path.join(directory, "benchmark.duckdb"))
+        create_trips(conn, args.num_trips)
+
+        in_memory, in_memory_seconds, in_memory_peak = run(
+            aggregate_trips_by_week_in_memory, conn
+        )
+        in_database, in_database_seconds, in_database_peak = run(
+            aggregate_trips_by_week_in_database, conn
+        )
+        conn.close()
+
+    pd.testing.assert_frame_equal(in_memory, in_database, check_dtype=False)
+
+    print(f"{args.num_trips:,} trips, {len(WEEKS)} weeks")
+    print(f"{'path':<12} {'seconds':>10} {'peak python memory (MB)':>26}")
+    for path, seconds, peak in [
+        ("in-memory", in_memory_seconds, in_memory_peak),
+        ("in-database", in_database_seconds, in_database_peak),
+    ]:
+        print(f"{path:<12} {seconds:>10.3f} {peak / 1024 / 1024:>26.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Compares how many row groups a one-week query on `trips` reads in arrival and sorted order.
+
+A month of synthetic trips is written to a raw parquet file in arrival order, with pickup times
+shuffled. It is loaded once as-is, the way `taxi_trips` used to, and once with
+`load_trips_partition`, which sorts the month on `pickup_datetime`. A week of trips is then
+queried from each table, and DuckDB's profiler reports how many rows the scan read after the
+row groups outside the week were skipped with their min/max zone maps. Run from the project root:
+
+    python benchmarks/trips_layout.py --num-trips 3000000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import duckdb
+
+from dagster_and_dbt.defs.assets.trips import load_trips_partition
+
+# DuckDB's default number of rows per row group
+ROW_GROUP_SIZE = 122_880
+
+WEEK_QUERY = """
+    select count(*), round(sum(total_amount), 2)
+    from trips
+    where pickup_datetime >= '2023-01-08' and pickup_datetime < '2023-01-15'
+"""
+
+
+def write_raw_trips(conn: duckdb.DuckDBPyConnection, file_path: str, num_trips: int):
+    """Writes `num_trips` raw trips spread over January 2023, in shuffled order."""
+    step_microseconds = 31 * 24 * 3600 * 1_000_000 // num_trips
+    conn.execute(f"""
+        copy (
+            select
+                (i % 2 + 1)::integer as VendorID,
+                (i % 263 + 1)::integer as PULocationID,
+                (i * 7 % 263 + 1)::integer as DOLocationID,
+                1.0 as RatecodeID,
+                1 as payment_type,
+                tpep_pickup_datetime + interval 15 minute as tpep_dropoff_datetime,
+                tpep_pickup_datetime,
+                (i % 100) / 10.0 as trip_distance,
+                (i % 4 + 1)::double as passenger_count,
+                (i % 5000) / 100.0 as total_amount
+            from (
+                select
+                    i,
+                    timestamp '2023-01-01'
+                        + to_microseconds(i::bigint * {step_microseconds}) as tpep_pickup_datetime
+                from range({num_trips}) as t(i)
+            )
+            order by hash(i)
+        ) to '{file_path}' (format parquet)
+    """)
+
+
+def load_in_arrival_order(conn: duckdb.DuckDBPyConnection, file_path: str) -> None:
+    conn.execute(f"""
+        create table trips as
+        select
+            VendorID as vendor_id, PULocationID as pickup_zone_id,
+            DOLocationID as dropoff_zone_id, RatecodeID as rate_code_id, payment_type,
+            tpep_dropoff_datetime as dropoff_datetime, tpep_pickup_datetime as pickup_datetime,
+            trip_distance, passenger_count, total_amount, '2023-01' as partition_date
+        from '{file_path}'
+    """)
+
+
+def query_week(conn: duckdb.DuckDBPyConnection) -> tuple[tuple, int, float]:
+    """Runs the one-week query, returning its result, the rows scanned and the seconds taken."""
+    conn.execute("set enable_profiling = 'no_output'")
+    conn.execute(
+        'set custom_profiling_settings = \'{"CUMULATIVE_ROWS_SCANNED": "true"}\''
+    )
+    start = time.perf_counter()
+    result = conn.execute(WEEK_QUERY).fetchall()[0]
+    elapsed = time.perf_counter() - start
+    profile = json.loads(conn.get_profiling_information())
+    return result, profile["cumulative_rows_scanned"], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num-trips", type=int, default=3_000_000)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "taxi_trips_2023-01.parquet")
+        write_raw_trips(duckdb.connect(), file_path, args.num_trips)
+
+        for layout, load in [
+            ("arrival", load_in_arrival_order),
+            (
+                "sorted",
+                lambda conn, file_path: load_trips_partition(
+                    conn, file_path, "2023-01"
+                ),
+            ),
+        ]:
+            conn = duckdb.connect(os.path.join(directory, f"{layout}.duckdb"))
+            load(conn, file_path)
+            row_groups = conn.execute(
+                "select count(distinct row_group_id) from pragma_storage_info('trips')"
+            ).fetchone()[0]
+            results.append((layout, row_groups, *query_week(conn)))
+            conn.close()
+
+    assert results[0][2] == results[1][2], "Both layouts must return the same week"
+
+    print(f"{args.num_trips:,} trips, one week queried out of January 2023")
+    print(
+        f"{'layout':<8} {'row groups':>11} {'row groups read':>16} {'rows scanned':>13} {'seconds':>8}"
+    )
+    for layout, row_groups, _, rows_scanned, seconds in results:
+        row_groups_read = -(-rows_scanned // ROW_GROUP_SIZE)
+        print(
+            f"{layout:<8} {row_groups:>11} {row_groups_read:>16} {rows_scanned:>13,} {seconds:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
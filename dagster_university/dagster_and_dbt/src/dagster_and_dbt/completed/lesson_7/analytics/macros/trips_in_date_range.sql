@@ -0,0 +1,17 @@
+{#
+    Whether a trip falls within the min_date and max_date vars, on its pickup datetime.
+    A trip picked up outside the month of its file counts as picked up on the first day of that
+    month, so every trip is in exactly one date range of a month.
+#}
+{% macro trips_in_date_range() %}
+    partition_date >= strftime(date '{{ var('min_date') }}', '%Y-%m')
+    and partition_date <= strftime(date '{{ var('max_date') }}' - interval 1 day, '%Y-%m')
+    and case
+        when strftime(pickup_datetime, '%Y-%m') = partition_date then pickup_datetime
+        else strptime(partition_date, '%Y-%m')
+    end >= '{{ var('min_date') }}'
+    and case
+        when strftime(pickup_datetime, '%Y-%m') = partition_date then pickup_datetime
+        else strptime(partition_date, '%Y-%m')
+    end < '{{ var('max_date') }}'
+{% endmacro %}
@@ -5,21 +5,22 @@
   )
 }}
 
+-- Built from the hourly rollup Dagster maintains, a day is a few thousand rows instead of every trip
 with
-    trips as (
+    trips_by_hour as (
         select *
-        from {{ ref('stg_trips') }}
+        from {{ source('raw_taxis', 'trips_by_hour') }}
     ),
     daily_summary as (
         select
-            date_trunc('day', pickup_datetime) as date_of_business,
-            count(*) as trip_count,
+            date_trunc('day', pickup_hour) as date_of_business,
+            sum(num_trips)::bigint as trip_count,
             sum(duration) as total_duration,
-            sum(duration) / count(*) as average_duration,
+            sum(duration) / sum(num_trips) as average_duration,
             sum(total_amount) as total_amount,
-            sum(total_amount) / count(*) as average_amount,
-            sum(case when duration > 30 then 1 else 0 end) / count(*) as pct_over_30_min
-        from trips
+            sum(total_amount) / sum(num_trips) as average_amount,
+            sum(num_trips_over_30_min) / sum(num_trips) as pct_over_30_min
+        from trips_by_hour
         group by all
     )
 select *
@@ -1,7 +1,19 @@
+{{
+  config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='date_of_business'
+  )
+}}
+
 with
     trips as (
         select *
         from {{ ref('stg_trips') }}
+        {% if is_incremental() %}
+            where pickup_datetime >= '{{ var('min_date') }}'
+            and pickup_datetime < '{{ var('max_date') }}'
+        {% endif %}
     ),
     zones as (
         select *
@@ -9,6 +21,7 @@ with
     ),
     trips_by_zone as (
         select
+            date_trunc('day', trips.pickup_datetime) as date_of_business,
             pickup_zones.zone_name as zone,
             dropoff_zones.borough as destination_borough,
             pickup_zones.is_airport as from_airport,
@@ -1,18 +1,34 @@
+{{
+  config(
+    materialized='incremental',
+    incremental_strategy='append',
+    pre_hook="{% if is_incremental() %}delete from {{ this }} where {{ trips_in_date_range() }}{% endif %}"
+  )
+}}
+
+{% set trip_key_columns = [
+    'partition_date',
+    'pickup_zone_id',
+    'dropoff_zone_id',
+    'pickup_datetime',
+    'dropoff_datetime',
+] %}
+
 with
     raw_trips as (
         select *
         from {{ source('raw_taxis', 'trips') }}
+        {% if is_incremental() %}
+            -- only the trips of the date range are replaced, the pre-hook deletes their old rows
+            where {{ trips_in_date_range() }}
+        {% endif %}
     )
 select
-    {{
-        dbt_utils.generate_surrogate_key([
-            'partition_date',
-            'pickup_zone_id',
-            'dropoff_zone_id',
-            'pickup_datetime',
-            'dropoff_datetime',
-        ])
-    }} as trip_id,
+    {% if var('trip_id_type') == 'integer' %}
+        hash({{ trip_key_columns | join(', ') }}) as trip_id,
+    {% else %}
+        {{ dbt_utils.generate_surrogate_key(trip_key_columns) }} as trip_id,
+    {% endif %}
     date_diff('minutes', pickup_datetime, dropoff_datetime) as duration,
     case payment_type
         when 0 then 'Unknown'
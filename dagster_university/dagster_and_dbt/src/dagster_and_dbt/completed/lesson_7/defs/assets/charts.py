@@ -0,0 +1,150 @@
+import atexit
+import base64
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from io import BytesIO
+
+import dagster as dg
+import pyarrow as pa
+
+# Resolution of the thumbnail inlined in the asset metadata, the saved image keeps the default
+PREVIEW_DPI = 40
+
+# Number of worker processes rendering charts, 0 renders them in the calling process.
+# matplotlib and geopandas are imported by the rendering functions, so with workers the run
+# process never imports them, and runs that make no charts never do either.
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "0"))
+
+
+@cache
+def _render_pool() -> ProcessPoolExecutor:
+    # Workers are spawned rather than forked, as forking a process running threads is unsafe
+    return ProcessPoolExecutor(
+        max_workers=CHART_RENDER_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+@atexit.register
+def shutdown_render_pool() -> None:
+    """Stops the chart rendering workers, if any were started. Called when the process exits."""
+    if _render_pool.cache_info().currsize:
+        _render_pool().shutdown()
+        _render_pool.cache_clear()
+
+
+def render(chart, *args, **kwargs) -> dict:
+    """Renders a chart with one of the functions of this module.
+
+    With `CHART_RENDER_WORKERS` set, the chart is rendered in a pool of worker processes, started
+    on the first chart and kept warm for the following ones until the process exits. Charts are
+    drawn on a bare `Figure`, without pyplot, so no GUI backend or global figure state is involved.
+
+    Args:
+        chart (Callable): The rendering function, such as `stacked_bar_chart`.
+        *args, **kwargs: The arguments of the rendering function, which must be picklable.
+
+    Returns:
+        metadata (dict): The metadata returned by the rendering function.
+    """
+    if CHART_RENDER_WORKERS <= 0:
+        return chart(*args, **kwargs)
+    return _render_pool().submit(chart, *args, **kwargs).result()
+
+
+def stacked_bar_chart(
+    table: pa.Table,
+    file_path: str,
+    title: str,
+    xlabel: str,
+    ylabel: str,
+    legend_title: str,
+    colormap: str = "tab10",
+    xtick_rotation: int = 90,
+    **savefig_kwargs,
+) -> dict:
+    """Draws an Arrow table as a stacked bar chart, one bar per row, and saves it.
+
+    The table is expected in the shape of a DuckDB `PIVOT`: the first column labels the bars and
+    every other column is a stack, named after its legend entry. Columns are read straight into
+    NumPy arrays, so nothing is converted to a pandas DataFrame. Missing values are left out of
+    their bar.
+    """
+    import numpy as np
+    import pyarrow.compute as pc
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+
+    positions = np.arange(table.num_rows)
+    bottom = np.zeros(table.num_rows)
+
+    stacks = table.column_names[1:]
+    colors = colormaps[colormap](np.linspace(0, 1, max(len(stacks), 2)))
+    for stack, color in zip(stacks, colors):
+        heights = pc.fill_null(table.column(stack), 0).to_numpy().astype(float)
+        ax.bar(positions, heights, bottom=bottom, label=stack, color=color)
+        bottom += heights
+
+    ax.set_xticks(positions, table.column(0).to_pylist(), rotation=xtick_rotation)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.legend(title=legend_title)
+
+    return save_chart(fig, file_path, **savefig_kwargs)
+
+
+def choropleth_map(
+    geojson_file_path: str,
+    file_path: str,
+    column: str,
+    title: str,
+    xlim: tuple[float, float],
+    ylim: tuple[float, float],
+) -> dict:
+    """Draws the polygons of a GeoJSON file colored by one of their properties, and saves it."""
+    import geopandas as gpd
+    from matplotlib.figure import Figure
+
+    geometries = gpd.read_file(geojson_file_path)
+
+    fig = Figure(figsize=(10, 10))
+    ax = fig.subplots()
+    geometries.plot(column=column, cmap="plasma", legend=True, ax=ax, edgecolor="black")
+    ax.set_title(title)
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+
+    return save_chart(fig, file_path, bbox_inches="tight")
+
+
+def save_chart(fig, file_path: str, **savefig_kwargs) -> dict:
+    """Saves a matplotlib figure as a PNG and builds the metadata describing it.
+
+    The full resolution image is written straight from memory to `file_path`. Only a downscaled
+    thumbnail is inlined into the metadata, next to a link to the full image.
+    """
+    from smart_open import open
+
+    image = BytesIO()
+    fig.savefig(image, format="png", **savefig_kwargs)
+
+    with open(file_path, "wb") as output_file:
+        output_file.write(image.getvalue())
+
+    preview = BytesIO()
+    fig.savefig(preview, format="png", dpi=PREVIEW_DPI, **savefig_kwargs)
+    base64_data = base64.b64encode(preview.getvalue()).decode("utf-8")
+
+    return {
+        "preview": dg.MetadataValue.md(
+            f"![Image](data:image/png;base64,{base64_data})"
+        ),
+        "image": dg.MetadataValue.path(file_path),
+        "Image size (bytes)": dg.MetadataValue.int(image.getbuffer().nbytes),
+    }
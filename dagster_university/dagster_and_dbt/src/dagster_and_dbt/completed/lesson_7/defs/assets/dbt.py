@@ -1,13 +1,167 @@
 import json
+import os
+from collections.abc import Sequence
 
 import dagster as dg
 from dagster_dbt import DagsterDbtTranslator, DbtCliResource, dbt_assets
+from dagster_dbt.asset_utils import DAGSTER_DBT_UNIQUE_ID_METADATA_KEY
 
 from dagster_and_dbt.completed.lesson_7.defs.partitions import daily_partition
-from dagster_and_dbt.completed.lesson_7.defs.project import dbt_project
+from dagster_and_dbt.completed.lesson_7.defs.project import load_manifest
 
 INCREMENTAL_SELECTOR = "config.materialized:incremental"
 
+# Upper bound on the dbt threads of a single build, whatever the width of the selected graph
+MAX_DBT_THREADS = int(os.getenv("DBT_MAX_THREADS", "4"))
+
+# Number of nodes listed in the summary logged after a build
+SLOWEST_NODES_TO_REPORT = int(os.getenv("DBT_SLOWEST_NODES_TO_REPORT", "10"))
+
+
+def max_concurrent_models(manifest: dict, unique_ids: set[str]) -> int:
+    """The largest number of selected dbt nodes that can be built at the same time.
+
+    Nodes are grouped into generations, each one depending only on nodes of earlier generations,
+    like the `location_metrics` and `daily_metrics` branches that both follow `stg_trips`. The
+    nodes of a generation do not depend on each other, so the widest generation bounds how many
+    dbt threads the build can keep busy.
+
+    Args:
+        manifest (dict): The dbt manifest.
+        unique_ids (set[str]): The unique ids of the selected dbt nodes.
+
+    Returns:
+        width (int): The size of the widest generation, at least 1.
+    """
+    parents = {
+        unique_id: set(manifest["nodes"][unique_id]["depends_on"]["nodes"]) & unique_ids
+        for unique_id in unique_ids
+    }
+
+    generations = {}
+    while len(generations) < len(parents):
+        for unique_id, node_parents in parents.items():
+            if unique_id not in generations and node_parents <= generations.keys():
+                generations[unique_id] = 1 + max(
+                    (generations[parent] for parent in node_parents), default=0
+                )
+
+    widths = {}
+    for generation in generations.values():
+        widths[generation] = widths.get(generation, 0) + 1
+    return max(widths.values(), default=1)
+
+
+def dbt_build_args(context: dg.AssetExecutionContext) -> list[str]:
+    """The `dbt build` arguments for the dbt models selected in this run.
+
+    The models run within a single dbt invocation, as DuckDB only allows one process to write to
+    the database at a time. Independent models still run concurrently on dbt threads, sized to the
+    width of the selected graph.
+    """
+    unique_ids = {
+        context.assets_def.specs_by_key[asset_key].metadata[
+            DAGSTER_DBT_UNIQUE_ID_METADATA_KEY
+        ]
+        for asset_key in context.selected_asset_keys
+    }
+    threads = min(max_concurrent_models(load_manifest(), unique_ids), MAX_DBT_THREADS)
+
+    context.log.info(f"Building {len(unique_ids)} dbt model(s) on {threads} thread(s)")
+    return ["build", "--threads", str(threads)]
+
+
+def summarize_run_results(
+    run_results: dict, top_n: int = SLOWEST_NODES_TO_REPORT
+) -> str:
+    """A summary of the run results of a dbt invocation, bounded to its `top_n` slowest nodes.
+
+    Compiled SQL is left out, as it grows with every model. Rows affected and bytes processed are
+    included when the adapter reports them.
+    """
+    results = sorted(
+        run_results["results"],
+        key=lambda result: result["execution_time"],
+        reverse=True,
+    )
+
+    lines = [
+        f"dbt ran {len(results)} node(s) in {run_results['elapsed_time']:.2f}s, slowest first:"
+    ]
+    for result in results[:top_n]:
+        adapter_response = result.get("adapter_response") or {}
+        details = [result["status"], f"{result['execution_time']:.2f}s"]
+        if adapter_response.get("rows_affected") is not None:
+            details.append(f"{adapter_response['rows_affected']} rows")
+        if adapter_response.get("bytes_processed") is not None:
+            details.append(f"{adapter_response['bytes_processed']} bytes")
+        lines.append(f"  {result['unique_id']}: {', '.join(details)}")
+
+    return "\n".join(lines)
+
+
+def run_result_metadata(result: dict) -> dict:
+    """The metadata of a dbt node from its run result, with what its adapter reports."""
+    adapter_response = result.get("adapter_response") or {}
+    metadata = {
+        "dbt status": dg.MetadataValue.text(result["status"]),
+        "Execution time (seconds)": dg.MetadataValue.float(result["execution_time"]),
+    }
+    if adapter_response.get("rows_affected") is not None:
+        metadata["Rows affected"] = dg.MetadataValue.int(
+            adapter_response["rows_affected"]
+        )
+    if adapter_response.get("bytes_processed") is not None:
+        metadata["Bytes processed"] = dg.MetadataValue.int(
+            adapter_response["bytes_processed"]
+        )
+    return metadata
+
+
+def with_run_results(events: list, run_results: dict) -> list:
+    """The events of a dbt invocation, with the run result of their node and the summary of the
+    invocation's slowest nodes added to the metadata of its outputs.
+    """
+    summary = dg.MetadataValue.text(summarize_run_results(run_results))
+    results = {result["unique_id"]: result for result in run_results["results"]}
+
+    events_with_run_results = []
+    for event in events:
+        if isinstance(event, dg.Output):
+            metadata = {**event.metadata, "dbt run summary": summary}
+            result = results.get(event.metadata["unique_id"].value)
+            if result is not None:
+                metadata.update(run_result_metadata(result))
+            event = event.with_metadata(metadata)
+        events_with_run_results.append(event)
+    return events_with_run_results
+
+
+def stream_dbt_build(
+    context: dg.AssetExecutionContext,
+    dbt: DbtCliResource,
+    extra_args: Sequence[str] = (),
+):
+    """Runs `dbt build` for the selected models and streams its events.
+
+    dbt writes its run results once it exits, so the events are held back until then for the
+    outputs of the models to carry them as metadata. If the build fails, the events of the models
+    that were built are yielded before its error is raised.
+    """
+    dbt_build_invocation = dbt.cli(
+        [*dbt_build_args(context), *extra_args], context=context, raise_on_error=False
+    )
+    events = list(dbt_build_invocation.stream())
+
+    if events:
+        run_results = dbt_build_invocation.get_artifact("run_results.json")
+        context.log.info(summarize_run_results(run_results))
+        yield from with_run_results(events, run_results)
+
+    error = dbt_build_invocation.get_error()
+    if error is not None:
+        raise error
+
 
 class CustomizedDagsterDbtTranslator(DagsterDbtTranslator):
     def get_group_name(self, dbt_resource_props):
@@ -16,40 +170,38 @@ class CustomizedDagsterDbtTranslator(DagsterDbtTranslator):
     def get_asset_key(self, dbt_resource_props):
         resource_type = dbt_resource_props["resource_type"]
         name = dbt_resource_props["name"]
-        if resource_type == "source":
+        # Sources with an asset key in their meta, like trips_by_hour, keep that key
+        dagster_meta = dbt_resource_props.get("meta", {}).get("dagster", {})
+        if resource_type == "source" and "asset_key" not in dagster_meta:
             return dg.AssetKey(f"taxi_{name}")
         else:
             return super().get_asset_key(dbt_resource_props)
 
 
 @dbt_assets(
-    manifest=dbt_project.manifest_path,
+    manifest=load_manifest(),
     dagster_dbt_translator=CustomizedDagsterDbtTranslator(),
     exclude=INCREMENTAL_SELECTOR,
 )
 def dbt_analytics(context: dg.AssetExecutionContext, dbt: DbtCliResource):
-    dbt_build_invocation = dbt.cli(["build"], context=context)
-
-    yield from dbt_build_invocation.stream()
-
-    run_results_json = dbt_build_invocation.get_artifact("run_results.json")
-    for result in run_results_json["results"]:
-        context.log.debug(result["compiled_code"])
+    yield from stream_dbt_build(context, dbt)
 
 
 @dbt_assets(
-    manifest=dbt_project.manifest_path,
+    manifest=load_manifest(),
     dagster_dbt_translator=CustomizedDagsterDbtTranslator(),
     select=INCREMENTAL_SELECTOR,
     partitions_def=daily_partition,
+    # A backfill runs as a single dbt build over its whole date range. dagster-dbt defaults time
+    # window partitions to this policy, it is set so the dbt vars below can rely on it
+    backfill_policy=dg.BackfillPolicy.single_run(),
 )
 def incremental_dbt_models(context: dg.AssetExecutionContext, dbt: DbtCliResource):
+    # Spans every partition of the run, so the vars cover a backfilled range at once
     time_window = context.partition_time_window
     dbt_vars = {
         "min_date": time_window.start.strftime("%Y-%m-%d"),
         "max_date": time_window.end.strftime("%Y-%m-%d"),
     }
 
-    yield from dbt.cli(
-        ["build", "--vars", json.dumps(dbt_vars)], context=context
-    ).stream()
+    yield from stream_dbt_build(context, dbt, ["--vars", json.dumps(dbt_vars)])
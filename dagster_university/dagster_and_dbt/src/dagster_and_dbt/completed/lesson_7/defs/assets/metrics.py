@@ -1,14 +1,63 @@
-import base64
-
 import dagster as dg
-import geopandas as gpd
-import matplotlib.pyplot as plt
 import pandas as pd
 from dagster_duckdb import DuckDBResource
 from smart_open import open
 
-from dagster_and_dbt.completed.lesson_7.defs.assets import constants
-from dagster_and_dbt.completed.lesson_7.defs.partitions import weekly_partition
+from dagster_and_dbt.completed.lesson_7.defs.assets import charts, constants
+from dagster_and_dbt.completed.lesson_7.defs.partitions import (
+    monthly_partition,
+    weekly_partition,
+)
+
+
+@dg.asset(
+    deps=[dg.AssetKey(["taxi_trips"])],
+    partitions_def=monthly_partition,
+    kinds={"duckdb"},
+)
+def trips_by_hour(context: dg.AssetExecutionContext, database: DuckDBResource):
+    """Trips rolled up by pickup hour and pickup zone, rebuilt a month at a time.
+    The dbt `daily_metrics` model is built from this rollup instead of scanning every trip.
+    """
+    month_to_fetch = context.partition_key[:-3]
+
+    query = f"""
+        create table if not exists trips_by_hour (
+            pickup_hour timestamp,
+            pickup_zone_id integer,
+            num_trips bigint,
+            num_trips_with_vendor bigint,
+            total_amount double,
+            trip_distance double,
+            passenger_count double,
+            duration bigint,
+            num_trips_over_30_min bigint,
+            partition_date varchar
+        );
+
+        delete from trips_by_hour where partition_date = '{month_to_fetch}';
+
+        insert into trips_by_hour
+        select
+            date_trunc('hour', pickup_datetime) as pickup_hour,
+            pickup_zone_id,
+            count(*) as num_trips,
+            count(vendor_id) as num_trips_with_vendor,
+            sum(total_amount) as total_amount,
+            sum(trip_distance) as trip_distance,
+            sum(passenger_count) as passenger_count,
+            sum(date_diff('minutes', pickup_datetime, dropoff_datetime)) as duration,
+            count_if(date_diff('minutes', pickup_datetime, dropoff_datetime) > 30)
+                as num_trips_over_30_min,
+            partition_date
+        from trips
+        where partition_date = '{month_to_fetch}'
+        group by all
+        order by pickup_hour;
+    """
+
+    with database.get_connection() as conn:
+        conn.execute(query)
 
 
 @dg.asset(
@@ -74,6 +123,9 @@ def trips_by_week(context: dg.AssetExecutionContext, database: DuckDBResource):
 )
 def manhattan_stats(database: DuckDBResource):
     """Metrics on taxi trips in Manhattan."""
+    # Imported here, so that runs without this asset don't pay for the import
+    import geopandas as gpd
+
     query = """
         select
             zones.zone,
@@ -102,29 +154,17 @@ def manhattan_stats(database: DuckDBResource):
 )
 def manhattan_map() -> dg.MaterializeResult:
     """A map of the number of trips per taxi zone in Manhattan."""
-    trips_by_zone = gpd.read_file("data/staging/manhattan_stats.geojson")
-
-    fig, ax = plt.subplots(figsize=(10, 10))
-    trips_by_zone.plot(
-        column="num_trips", cmap="plasma", legend=True, ax=ax, edgecolor="black"
+    metadata = charts.render(
+        charts.choropleth_map,
+        constants.MANHATTAN_STATS_FILE_PATH,
+        constants.MANHATTAN_MAP_FILE_PATH,
+        column="num_trips",
+        title="Number of Trips per Taxi Zone in Manhattan",
+        xlim=(-74.05, -73.90),  # Adjust longitude range
+        ylim=(40.70, 40.82),  # Adjust latitude range
     )
-    ax.set_title("Number of Trips per Taxi Zone in Manhattan")
-
-    ax.set_xlim([-74.05, -73.90])  # Adjust longitude range
-    ax.set_ylim([40.70, 40.82])  # Adjust latitude range
-
-    # Save the image
-    plt.savefig(constants.MANHATTAN_MAP_FILE_PATH, format="png", bbox_inches="tight")
-    plt.close(fig)
 
-    with open(constants.MANHATTAN_MAP_FILE_PATH, "rb") as file:
-        image_data = file.read()
-
-    # Convert the image data to base64
-    base64_data = base64.b64encode(image_data).decode("utf-8")
-    md_content = f"![Image](data:image/jpeg;base64,{base64_data})"
-
-    return dg.MaterializeResult(metadata={"preview": dg.MetadataValue.md(md_content)})
+    return dg.MaterializeResult(metadata=metadata)
 
 
 @dg.asset(
@@ -135,41 +175,30 @@ def airport_trips(database: DuckDBResource) -> dg.MaterializeResult:
     A chart of where trips from the airport go
     """
 
+    # Pivot in DuckDB, one column of trips per destination borough
     query = """
-        select
-            zone,
-            destination_borough,
-            trips
-        from location_metrics
-        where from_airport
+        pivot (
+            select zone, destination_borough, trips
+            from location_metrics
+            where from_airport and destination_borough is not null
+        )
+        on destination_borough
+        using sum(trips)::bigint
+        group by zone
+        order by zone
     """
     with database.get_connection() as conn:
-        airport_trips = conn.execute(query).fetch_df()
-
-    # Plot bars
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    # Group data by destination_borough and plot the bar chart
-    airport_trips.groupby(["zone", "destination_borough"]).sum()[
-        "trips"
-    ].unstack().plot(kind="bar", stacked=True, ax=ax)
-
-    # Customize the plot
-    ax.set_xlabel("Zone")
-    ax.set_ylabel("Number of Trips")
-    ax.set_title("Trips from Airport by Destination Borough")
-    ax.legend(title="Destination Borough")
-
-    # Save the image
-    plt.savefig(constants.AIRPORT_TRIPS_FILE_PATH, format="png", bbox_inches="tight")
-    plt.close(fig)
-
-    # Convert the image data to base64
-    with open(constants.AIRPORT_TRIPS_FILE_PATH, "rb") as file:
-        image_data = file.read()
-
-    # Convert the image data to base64
-    base64_data = base64.b64encode(image_data).decode("utf-8")
-    md_content = f"![Image](data:image/jpeg;base64,{base64_data})"
+        airport_trips = conn.execute(query).fetch_arrow_table()
+
+    metadata = charts.render(
+        charts.stacked_bar_chart,
+        airport_trips,
+        constants.AIRPORT_TRIPS_FILE_PATH,
+        title="Trips from Airport by Destination Borough",
+        xlabel="Zone",
+        ylabel="Number of Trips",
+        legend_title="Destination Borough",
+        bbox_inches="tight",
+    )
 
-    return dg.MaterializeResult(metadata={"preview": dg.MetadataValue.md(md_content)})
+    return dg.MaterializeResult(metadata=metadata)
@@ -1,11 +1,7 @@
-import base64
-
 import dagster as dg
-import matplotlib.pyplot as plt
 from dagster_duckdb import DuckDBResource
-from smart_open import open
 
-from dagster_and_dbt.completed.lesson_7.defs.assets import constants
+from dagster_and_dbt.completed.lesson_7.defs.assets import charts, constants
 
 
 class AdhocRequestConfig(dg.Config):
@@ -30,63 +26,44 @@ def adhoc_request(
         config.filename.split(".")[0]
     )
 
-    # count the number of trips that picked up in a given borough, aggregated by time of day and hour of day
+    # count the number of trips that picked up in a given borough, by hour of day, with a column
+    # for each day of the week
     query = f"""
-        select
-            date_part('hour', pickup_datetime) as hour_of_day,
-            date_part('dayofweek', pickup_datetime) as day_of_week_num,
-            case date_part('dayofweek', pickup_datetime)
-                when 0 then 'Sunday'
-                when 1 then 'Monday'
-                when 2 then 'Tuesday'
-                when 3 then 'Wednesday'
-                when 4 then 'Thursday'
-                when 5 then 'Friday'
-                when 6 then 'Saturday'
-            end as day_of_week,
-            count(*) as num_trips
-        from trips
-        left join zones on trips.pickup_zone_id = zones.zone_id
-        where pickup_datetime >= '{config.start_date}'
-        and pickup_datetime < '{config.end_date}'
-        and pickup_zone_id in (
-            select zone_id
-            from zones
-            where borough = '{config.borough}'
+        pivot (
+            select
+                date_part('hour', pickup_datetime) as hour_of_day,
+                dayname(pickup_datetime) as day_of_week
+            from trips
+            where pickup_datetime >= '{config.start_date}'
+            and pickup_datetime < '{config.end_date}'
+            and pickup_zone_id in (
+                select zone_id
+                from zones
+                where borough = '{config.borough}'
+            )
+        )
+        on day_of_week in (
+            'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'
         )
-        group by 1, 2
-        order by 1, 2 asc
+        using count(*)
+        group by hour_of_day
+        order by hour_of_day
     """
 
     with database.get_connection() as conn:
-        results = conn.execute(query).fetch_df()
-
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    # Pivot data for stacked bar chart
-    results_pivot = results.pivot(
-        index="hour_of_day", columns="day_of_week", values="num_trips"
-    )
-    results_pivot.plot(kind="bar", stacked=True, ax=ax, colormap="viridis")
-
-    ax.set_title(
-        f"Number of trips by hour of day in {config.borough}, from {config.start_date} to {config.end_date}"
+        results = conn.execute(query).fetch_arrow_table()
+
+    metadata = charts.render(
+        charts.stacked_bar_chart,
+        results,
+        file_path,
+        title=f"Number of trips by hour of day in {config.borough}, from {config.start_date} to {config.end_date}",
+        xlabel="Hour of Day",
+        ylabel="Number of Trips",
+        legend_title="Day of Week",
+        colormap="viridis",
+        xtick_rotation=45,
+        bbox_inches="tight",
     )
-    ax.set_xlabel("Hour of Day")
-    ax.set_ylabel("Number of Trips")
-    ax.legend(title="Day of Week")
-
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    plt.savefig(file_path)
-    plt.close(fig)
-
-    with open(file_path, "rb") as file:
-        image_data = file.read()
-
-    # Convert the image data to base64
-    base64_data = base64.b64encode(image_data).decode("utf-8")
-    md_content = f"![Image](data:image/jpeg;base64,{base64_data})"
 
-    return dg.MaterializeResult(metadata={"preview": dg.MetadataValue.md(md_content)})
+    return dg.MaterializeResult(metadata=metadata)
@@ -1,9 +1,59 @@
+import hashlib
+import json
+from functools import cache
 from pathlib import Path
 
-from dagster_dbt import DbtProject
+from dagster_dbt import DagsterDbtProjectPreparer, DbtProject
+
+# Generated by dbt, so they never change what `dbt parse` produces
+UNTRACKED_DIRECTORIES = {"target", "dbt_packages", "logs"}
+
+
+def project_fingerprint(project_dir: Path) -> str:
+    """A hash of every file of the dbt project that `dbt parse` reads."""
+    digest = hashlib.sha256()
+    for path in sorted(project_dir.rglob("*")):
+        relative_path = path.relative_to(project_dir)
+        if (
+            not path.is_file()
+            or relative_path.parts[0] in UNTRACKED_DIRECTORIES
+            or path.name.startswith(".")
+        ):
+            continue
+        digest.update(str(relative_path).encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class CachedDbtProjectPreparer(DagsterDbtProjectPreparer):
+    """Skips `dbt deps` and `dbt parse` when the project is unchanged since the manifest was made.
+
+    The fingerprint of the project files is stored next to the manifest once it is prepared, so
+    every process started by `dagster dev`, including run workers, reuses the same manifest.
+    """
+
+    def prepare(self, project: DbtProject) -> None:
+        fingerprint_path = project.manifest_path.with_suffix(".sha256")
+        fingerprint = project_fingerprint(project.project_dir)
+        if (
+            project.manifest_path.exists()
+            and fingerprint_path.exists()
+            and fingerprint_path.read_text() == fingerprint
+        ):
+            return
+
+        super().prepare(project)
+        fingerprint_path.write_text(fingerprint)
+
 
 dbt_project = DbtProject(
     project_dir=Path(__file__).joinpath("../..", "analytics").resolve(),
 )
 
-dbt_project.prepare_if_dev()
+CachedDbtProjectPreparer().prepare_if_dev(dbt_project)
+
+
+@cache
+def load_manifest() -> dict:
+    """The parsed dbt manifest, loaded once per process and shared by every dbt definition."""
+    return json.loads(dbt_project.manifest_path.read_text())
@@ -0,0 +1,45 @@
+import base64
+from io import BytesIO
+
+import dagster as dg
+
+from dagster_and_dbt.defs.resources import get_smart_open_config
+
+# Resolution of the thumbnail inlined in the asset metadata, the saved image keeps the default
+PREVIEW_DPI = 40
+
+
+def save_chart(fig, file_path: str, **savefig_kwargs) -> dict:
+    """Saves a matplotlib figure as a PNG and builds the metadata describing it.
+
+    The full resolution image is written straight from memory to `file_path`. Only a downscaled
+    thumbnail is inlined into the metadata, next to a link to the full image, which keeps the
+    event log small.
+
+    Args:
+        fig (matplotlib.figure.Figure): The figure to save.
+        file_path (str): The local path or smart_open URI to write the image to.
+        **savefig_kwargs: Extra arguments passed to `Figure.savefig`.
+
+    Returns:
+        metadata (dict): The preview, image path and image size metadata.
+    """
+    from smart_open import open
+
+    image = BytesIO()
+    fig.savefig(image, format="png", **savefig_kwargs)
+
+    with open(file_path, "wb", transport_params=get_smart_open_config()) as output_file:
+        output_file.write(image.getvalue())
+
+    preview = BytesIO()
+    fig.savefig(preview, format="png", dpi=PREVIEW_DPI, **savefig_kwargs)
+    base64_data = base64.b64encode(preview.getvalue()).decode("utf-8")
+
+    return {
+        "preview": dg.MetadataValue.md(
+            f"![Image](data:image/png;base64,{base64_data})"
+        ),
+        "image": dg.MetadataValue.path(file_path),
+        "Image size (bytes)": dg.MetadataValue.int(image.getbuffer().nbytes),
+    }
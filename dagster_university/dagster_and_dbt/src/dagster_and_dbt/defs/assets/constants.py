@@ -28,7 +28,7 @@ TRIPS_BY_WEEK_FILE_PATH = get_path_for_env(
     os.path.join("data", "outputs", "trips_by_week.csv")
 )
 MANHATTAN_STATS_FILE_PATH = get_path_for_env(
-    os.path.join("data", "staging", "manhattan_stats.geojson")
+    os.path.join("data", "staging", "manhattan_stats.parquet")
 )
 MANHATTAN_MAP_FILE_PATH = get_path_for_env(
     os.path.join("data", "outputs", "manhattan_map.png")
@@ -37,6 +37,9 @@ MANHATTAN_MAP_FILE_PATH = get_path_for_env(
 REQUEST_DESTINATION_TEMPLATE_FILE_PATH = get_path_for_env(
     os.path.join("data", "outputs", "{}.png")
 )
+REQUEST_CACHE_TEMPLATE_FILE_PATH = get_path_for_env(
+    os.path.join("data", "staging", "request_cache_{}.json")
+)
 
 DATE_FORMAT = "%Y-%m-%d"
 
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from typing import TYPE_CHECKING
+
+import requests
+
+# boto3, smart_open and pyarrow are imported by the functions using them, so that loading the
+# definitions doesn't import them
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 60
+
+
+def _is_local(path: str) -> bool:
+    return "://" not in path
+
+
+def _upload_to_s3(
+    response: requests.Response, path: str, client, transfer_config: TransferConfig
+) -> int:
+    """Uploads the body of a streamed response to an `s3://bucket/key` path.
+
+    boto3 reads the body in parts of `multipart_chunksize` bytes and uploads up to
+    `max_concurrency` of them at once, so memory stays bounded by the parts in flight.
+    """
+    bucket, key = path[len("s3://") :].split("/", 1)
+
+    num_bytes = 0
+    lock = threading.Lock()
+
+    # Called from the upload threads with the bytes of each request sent
+    def count_bytes(sent: int) -> None:
+        nonlocal num_bytes
+        with lock:
+            num_bytes += sent
+
+    # Let urllib3 undo any content encoding, as iter_content does
+    response.raw.decode_content = True
+    client.upload_fileobj(
+        response.raw, bucket, key, Config=transfer_config, Callback=count_bytes
+    )
+    return num_bytes
+
+
+def stream_to_path(
+    url: str,
+    path: str,
+    transport_params: dict,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    transfer_config: TransferConfig | None = None,
+) -> int:
+    """Streams the response body of `url` to `path` in chunks of `chunk_size` bytes.
+
+    Local files are written to a temporary file in the destination directory and renamed into
+    place once the download completes. Remote paths are written through smart_open, whose S3
+    writer uploads in bounded parts and only creates the object when the upload is completed.
+    With a `transfer_config`, S3 paths are instead uploaded by boto3, which sends several parts in
+    parallel with the client of `transport_params`.
+
+    Args:
+        url (str): The URL to download.
+        path (str): The local path or smart_open URI to write to.
+        transport_params (dict): The smart_open transport params used for remote paths.
+        chunk_size (int): The number of bytes read from the response at a time.
+        transfer_config (TransferConfig): The part size and concurrency of S3 uploads.
+
+    Returns:
+        num_bytes (int): The number of bytes written.
+    """
+    from smart_open import open
+
+    num_bytes = 0
+
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+
+        if transfer_config is not None and path.startswith("s3://"):
+            import boto3
+
+            client = transport_params.get("client") or boto3.client("s3")
+            return _upload_to_s3(response, path, client, transfer_config)
+
+        if not _is_local(path):
+            with open(path, "wb", transport_params=transport_params) as output_file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    output_file.write(chunk)
+                    num_bytes += len(chunk)
+            return num_bytes
+
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", suffix=".part"
+        )
+        try:
+            with os.fdopen(fd, "wb") as output_file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    output_file.write(chunk)
+                    num_bytes += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return num_bytes
+
+
+def parquet_num_rows(path: str, transport_params: dict) -> int:
+    """Reads the number of rows of a parquet file from its footer metadata.
+
+    Only the footer is read, so this is cheap for both local files and ranged reads from S3.
+    """
+    import pyarrow.parquet as pq
+    from smart_open import open
+
+    with open(path, "rb", transport_params=transport_params) as parquet_file:
+        return pq.ParquetFile(parquet_file).metadata.num_rows
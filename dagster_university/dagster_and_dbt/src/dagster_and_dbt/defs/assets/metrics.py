@@ -1,27 +1,109 @@
-import base64
+from typing import TYPE_CHECKING
 
 import dagster as dg
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import pandas as pd
-from dagster_duckdb import DuckDBResource
-from smart_open import open
 
-from dagster_and_dbt.defs.assets import constants
-from dagster_and_dbt.defs.partitions import weekly_partition
+from dagster_and_dbt.defs.assets import charts, constants
+from dagster_and_dbt.defs.partitions import monthly_partition, weekly_partition
+from dagster_and_dbt.defs.resources import (
+    PooledDuckDBResource,
+    get_smart_open_config,
+)
+
+# pandas, geopandas and matplotlib are imported by the functions using them, so that loading the
+# definitions doesn't import them
+if TYPE_CHECKING:
+    import pandas as pd
+
+TRIPS_BY_WEEK_COLUMNS = [
+    "period",
+    "num_trips",
+    "total_amount",
+    "trip_distance",
+    "passenger_count",
+]
+
+
+def load_trips_by_hour(conn, month_to_fetch: str) -> None:
+    """Replaces a month of the `trips_by_hour` rollup with the trips of that month.
+
+    The rollup holds one row per pickup hour and zone, with the sums needed to aggregate trips at
+    any coarser grain without scanning `trips`. `num_trips` counts every trip, while
+    `num_trips_with_vendor` leaves out the trips without a vendor, which `trips_by_week` excludes.
+
+    Args:
+        conn: The DuckDB connection to aggregate the trips with.
+        month_to_fetch (str): The month to aggregate, in the YYYY-MM format.
+    """
+    conn.execute("""
+        create table if not exists trips_by_hour (
+            pickup_hour timestamp,
+            pickup_zone_id integer,
+            num_trips bigint,
+            num_trips_with_vendor bigint,
+            total_amount double,
+            trip_distance double,
+            passenger_count double,
+            duration bigint,
+            num_trips_over_30_min bigint,
+            partition_date varchar
+        )
+    """)
+    conn.execute(f"delete from trips_by_hour where partition_date = '{month_to_fetch}'")
+    conn.execute(f"""
+        insert into trips_by_hour
+        select
+            date_trunc('hour', pickup_datetime) as pickup_hour,
+            pickup_zone_id,
+            count(*) as num_trips,
+            count(vendor_id) as num_trips_with_vendor,
+            sum(total_amount) as total_amount,
+            sum(trip_distance) as trip_distance,
+            sum(passenger_count) as passenger_count,
+            sum(date_diff('minutes', pickup_datetime, dropoff_datetime)) as duration,
+            count_if(date_diff('minutes', pickup_datetime, dropoff_datetime) > 30)
+                as num_trips_over_30_min,
+            partition_date
+        from trips
+        where partition_date = '{month_to_fetch}'
+        group by all
+        order by pickup_hour
+    """)
 
 
 @dg.asset(
     deps=[dg.AssetKey(["taxi_trips"])],
-    partitions_def=weekly_partition,
+    partitions_def=monthly_partition,
     kinds={"duckdb"},
 )
-def trips_by_week(context: dg.AssetExecutionContext, database: DuckDBResource):
-    """The number of trips per week, aggregated by week.
-    These date-based aggregations are done in-memory, which is expensive, but enables you to do time-based aggregations consistently across data warehouses (ex. DuckDB and BigQuery).
+def trips_by_hour(
+    context: dg.AssetExecutionContext, database: PooledDuckDBResource
+) -> dg.MaterializeResult:
+    """Trips rolled up by pickup hour and pickup zone, rebuilt a month at a time.
+    `trips_by_week` and `adhoc_request` read this rollup instead of scanning every trip.
     """
-    period_to_fetch = context.partition_key
+    month_to_fetch = context.partition_key[:-3]
+
+    with database.get_connection() as conn:
+        load_trips_by_hour(conn, month_to_fetch)
+        num_rows = conn.execute(
+            "select count(*) from trips_by_hour where partition_date = ?",
+            [month_to_fetch],
+        ).fetchone()[0]
+
+    return dg.MaterializeResult(
+        metadata={
+            "Number of records": dg.MetadataValue.int(num_rows),
+            **conn.profile.to_metadata(),
+        }
+    )
 
+
+def aggregate_trips_by_week_in_memory(conn, period_to_fetch: str) -> "pd.DataFrame":
+    """Aggregates a week of trips in pandas.
+
+    Every trip in the week is fetched, which is expensive, but keeps the date-based aggregation
+    consistent across data warehouses (ex. DuckDB and BigQuery).
+    """
     # get all trips for the week
     query = f"""
         select vendor_id, total_amount, trip_distance, passenger_count
@@ -30,8 +112,7 @@ def trips_by_week(context: dg.AssetExecutionContext, database: DuckDBResource):
             and pickup_datetime < '{period_to_fetch}'::date + interval '1 week'
     """
 
-    with database.get_connection() as conn:
-        data_for_month = conn.execute(query).fetch_df()
+    data_for_month = conn.execute(query).fetch_df()
 
     aggregate = (
         data_for_month.agg(
@@ -53,18 +134,112 @@ def trips_by_week(context: dg.AssetExecutionContext, database: DuckDBResource):
     aggregate["passenger_count"] = aggregate["passenger_count"].astype(int)
     aggregate["total_amount"] = aggregate["total_amount"].round(2).astype(float)
     aggregate["trip_distance"] = aggregate["trip_distance"].round(2).astype(float)
-    aggregate = aggregate[
-        ["period", "num_trips", "total_amount", "trip_distance", "passenger_count"]
-    ]
+    return aggregate[TRIPS_BY_WEEK_COLUMNS]
+
+
+def aggregate_trips_by_week_in_database(conn, period_to_fetch: str) -> "pd.DataFrame":
+    """Aggregates a week of trips in DuckDB from the `trips_by_hour` rollup, so only the
+    aggregated row is fetched and a week is a few thousand rows to scan.
+
+    Matches `aggregate_trips_by_week_in_memory`, including zeros for a week without trips.
+    """
+    query = f"""
+        select
+            '{period_to_fetch}' as period,
+            coalesce(sum(num_trips_with_vendor), 0)::bigint as num_trips,
+            round(coalesce(sum(total_amount), 0), 2)::double as total_amount,
+            round(coalesce(sum(trip_distance), 0), 2)::double as trip_distance,
+            coalesce(sum(passenger_count), 0)::bigint as passenger_count
+        from trips_by_hour
+        where pickup_hour >= '{period_to_fetch}'
+            and pickup_hour < '{period_to_fetch}'::date + interval '1 week'
+    """
+
+    aggregate = conn.execute(query).fetch_df()
+    aggregate["num_trips"] = aggregate["num_trips"].astype(int)
+    aggregate["passenger_count"] = aggregate["passenger_count"].astype(int)
+    return aggregate[TRIPS_BY_WEEK_COLUMNS]
 
-    try:
-        # If the file already exists, append to it, but replace the existing month's data
-        existing = pd.read_csv(constants.TRIPS_BY_WEEK_FILE_PATH)
-        existing = existing[existing["period"] != period_to_fetch]
-        existing = pd.concat([existing, aggregate]).sort_values(by="period")
-        existing.to_csv(constants.TRIPS_BY_WEEK_FILE_PATH, index=False)
-    except FileNotFoundError:
-        aggregate.to_csv(constants.TRIPS_BY_WEEK_FILE_PATH, index=False)
+
+class TripsByWeekConfig(dg.Config):
+    # Aggregate in DuckDB instead of fetching every trip of the week into pandas
+    aggregate_in_database: bool = True
+
+
+@dg.asset(
+    deps=[dg.AssetKey(["taxi_trips"]), dg.AssetKey(["trips_by_hour"])],
+    partitions_def=weekly_partition,
+    kinds={"duckdb"},
+)
+def trips_by_week(
+    context: dg.AssetExecutionContext,
+    config: TripsByWeekConfig,
+    database: PooledDuckDBResource,
+) -> dg.MaterializeResult:
+    """The number of trips per week, aggregated by week.
+    The aggregation is pushed down to DuckDB by default. Set `aggregate_in_database` to false to aggregate in-memory, which is expensive, but enables you to do time-based aggregations consistently across data warehouses (ex. DuckDB and BigQuery).
+    """
+    period_to_fetch = context.partition_key
+
+    with database.get_connection() as conn:
+        if config.aggregate_in_database:
+            aggregate = aggregate_trips_by_week_in_database(conn, period_to_fetch)
+        else:
+            aggregate = aggregate_trips_by_week_in_memory(conn, period_to_fetch)
+
+        upsert_trips_by_week(conn, aggregate)
+
+    return dg.MaterializeResult(metadata=conn.profile.to_metadata())
+
+
+def upsert_trips_by_week(conn, aggregate: "pd.DataFrame") -> None:
+    """Inserts the weekly aggregates into the `trips_by_week` table, replacing existing periods.
+
+    Each partition only touches its own row, and the database resource serializes writers, so
+    partitions can be materialized in parallel without overwriting each other.
+    """
+    conn.execute("""
+        create table if not exists trips_by_week (
+            period date primary key,
+            num_trips bigint,
+            total_amount double,
+            trip_distance double,
+            passenger_count bigint
+        )
+    """)
+    conn.register("aggregate", aggregate)
+    conn.execute("""
+        insert or replace into trips_by_week
+        select period::date, num_trips, total_amount, trip_distance, passenger_count
+        from aggregate
+    """)
+    conn.unregister("aggregate")
+
+
+@dg.asset(
+    deps=[dg.AssetKey(["trips_by_week"])],
+    kinds={"duckdb", "csv"},
+)
+def trips_by_week_csv(database: PooledDuckDBResource) -> dg.MaterializeResult:
+    """A CSV export of the `trips_by_week` table, generated on demand."""
+    from smart_open import open
+
+    with database.get_connection(read_only=True) as conn:
+        trips_by_week = conn.execute(
+            "select * from trips_by_week order by period"
+        ).fetch_df()
+
+    trips_by_week["period"] = trips_by_week["period"].dt.strftime(constants.DATE_FORMAT)
+
+    with open(constants.TRIPS_BY_WEEK_FILE_PATH, "w") as output_file:
+        trips_by_week.to_csv(output_file, index=False)
+
+    return dg.MaterializeResult(
+        metadata={
+            "Number of weeks": dg.MetadataValue.int(len(trips_by_week)),
+            **conn.profile.to_metadata(),
+        }
+    )
 
 
 @dg.asset(
@@ -72,28 +247,47 @@ def trips_by_week(context: dg.AssetExecutionContext, database: DuckDBResource):
     key_prefix="manhattan",
     kinds={"duckdb"},
 )
-def manhattan_stats(database: DuckDBResource):
-    """Metrics on taxi trips in Manhattan."""
+def manhattan_stats(database: PooledDuckDBResource) -> dg.MaterializeResult:
+    """Metrics on taxi trips in Manhattan.
+    Trips are counted by zone id, then joined to the WKB geometries parsed by `taxi_zones`.
+    """
+    import geopandas as gpd
+    from smart_open import open
+
     query = """
+        with trips_by_zone as (
+            select pickup_zone_id as zone_id, count(1) as num_trips
+            from trips
+            group by pickup_zone_id
+        )
         select
             zones.zone,
             zones.borough,
-            zones.geometry,
-            count(1) as num_trips,
-        from trips
-        left join zones on trips.pickup_zone_id = zones.zone_id
-        where geometry is not null
-        group by zone, borough, geometry
+            zone_geometries.geometry,
+            trips_by_zone.num_trips,
+        from trips_by_zone
+        join zones on trips_by_zone.zone_id = zones.zone_id
+        join zone_geometries on trips_by_zone.zone_id = zone_geometries.zone_id
     """
 
-    with database.get_connection() as conn:
+    with database.get_connection(read_only=True) as conn:
         trips_by_zone = conn.execute(query).fetch_df()
 
-    trips_by_zone["geometry"] = gpd.GeoSeries.from_wkt(trips_by_zone["geometry"])
+    # DuckDB returns blobs as bytearrays, which shapely does not accept
+    trips_by_zone["geometry"] = gpd.GeoSeries.from_wkb(
+        trips_by_zone["geometry"].map(bytes)
+    )
     trips_by_zone = gpd.GeoDataFrame(trips_by_zone)
 
-    with open(constants.MANHATTAN_STATS_FILE_PATH, "w") as output_file:
-        output_file.write(trips_by_zone.to_json())
+    # GeoParquet keeps the geometries as WKB, so nothing is serialized to text
+    with open(
+        constants.MANHATTAN_STATS_FILE_PATH,
+        "wb",
+        transport_params=get_smart_open_config(),
+    ) as output_file:
+        trips_by_zone.to_parquet(output_file)
+
+    return dg.MaterializeResult(metadata=conn.profile.to_metadata())
 
 
 @dg.asset(
@@ -102,7 +296,16 @@ def manhattan_stats(database: DuckDBResource):
 )
 def manhattan_map() -> dg.MaterializeResult:
     """A map of the number of trips per taxi zone in Manhattan."""
-    trips_by_zone = gpd.read_file("data/staging/manhattan_stats.geojson")
+    import geopandas as gpd
+    import matplotlib.pyplot as plt
+    from smart_open import open
+
+    with open(
+        constants.MANHATTAN_STATS_FILE_PATH,
+        "rb",
+        transport_params=get_smart_open_config(),
+    ) as input_file:
+        trips_by_zone = gpd.read_parquet(input_file)
 
     fig, ax = plt.subplots(figsize=(10, 10))
     trips_by_zone.plot(
@@ -113,15 +316,9 @@ def manhattan_map() -> dg.MaterializeResult:
     ax.set_xlim([-74.05, -73.90])  # Adjust longitude range
     ax.set_ylim([40.70, 40.82])  # Adjust latitude range
 
-    # Save the image
-    plt.savefig(constants.MANHATTAN_MAP_FILE_PATH, format="png", bbox_inches="tight")
+    metadata = charts.save_chart(
+        fig, constants.MANHATTAN_MAP_FILE_PATH, bbox_inches="tight"
+    )
     plt.close(fig)
 
-    with open(constants.MANHATTAN_MAP_FILE_PATH, "rb") as file:
-        image_data = file.read()
-
-    # Convert the image data to base64
-    base64_data = base64.b64encode(image_data).decode("utf-8")
-    md_content = f"![Image](data:image/jpeg;base64,{base64_data})"
-
-    return dg.MaterializeResult(metadata={"preview": dg.MetadataValue.md(md_content)})
+    return dg.MaterializeResult(metadata=metadata)
@@ -1,11 +1,30 @@
-import base64
+import hashlib
+import json
+import time
+from io import StringIO
+from typing import TYPE_CHECKING
 
 import dagster as dg
-import matplotlib.pyplot as plt
-from dagster_duckdb import DuckDBResource
-from smart_open import open
 
-from dagster_and_dbt.defs.assets import constants
+from dagster_and_dbt.defs.assets import charts, constants
+from dagster_and_dbt.defs.resources import (
+    PooledDuckDBResource,
+    get_smart_open_config,
+)
+
+# pandas and matplotlib are only imported by the runs answering requests
+if TYPE_CHECKING:
+    import pandas as pd
+
+DAYS_OF_WEEK = {
+    0: "Sunday",
+    1: "Monday",
+    2: "Tuesday",
+    3: "Wednesday",
+    4: "Thursday",
+    5: "Friday",
+    6: "Saturday",
+}
 
 
 class AdhocRequestConfig(dg.Config):
@@ -15,51 +34,124 @@ class AdhocRequestConfig(dg.Config):
     end_date: str
 
 
-@dg.asset(
-    deps=["taxi_trips", "taxi_zones"],
-    kinds={"python"},
-)
-def adhoc_request(
-    config: AdhocRequestConfig, database: DuckDBResource
-) -> dg.MaterializeResult:
-    """The response to an request made in the `requests` directory.
-    See `requests/README.md` for more information.
-    """
-    # strip the file extension from the filename, and use it as the output filename
-    file_path = constants.REQUEST_DESTINATION_TEMPLATE_FILE_PATH.format(
-        config.filename.split(".")[0]
-    )
+class AdhocRequestBatchConfig(dg.Config):
+    requests: list[AdhocRequestConfig]
+
+
+def _request_key(request: AdhocRequestConfig) -> tuple[str, str, str]:
+    return request.borough, request.start_date, request.end_date
+
+
+def _cache_file_path(key: tuple[str, str, str]) -> str:
+    digest = hashlib.sha256("|".join(key).encode("utf-8")).hexdigest()
+    return constants.REQUEST_CACHE_TEMPLATE_FILE_PATH.format(digest)
+
+
+def _read_cached_results(key: tuple[str, str, str], valid_after: float):
+    """The cached results for a request, if they were computed after `valid_after`."""
+    import pandas as pd
+    from smart_open import open
+
+    try:
+        with open(
+            _cache_file_path(key), "r", transport_params=get_smart_open_config()
+        ) as cache_file:
+            entry = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    if entry["created_at"] <= valid_after:
+        return None
+    return pd.read_json(StringIO(entry["results"]), orient="split")
+
+
+def _write_cached_results(
+    key: tuple[str, str, str], results: "pd.DataFrame", created_at: float
+) -> None:
+    from smart_open import open
+
+    with open(
+        _cache_file_path(key), "w", transport_params=get_smart_open_config()
+    ) as cache_file:
+        json.dump(
+            {
+                "key": list(key),
+                "created_at": created_at,
+                "results": results.to_json(orient="split", index=False),
+            },
+            cache_file,
+        )
+
 
-    # count the number of trips that picked up in a given borough, aggregated by time of day and hour of day
+def _latest_upstream_materialization(context: dg.AssetExecutionContext) -> float:
+    """The timestamp of the latest `trips_by_hour` or `taxi_zones` materialization.
+    Cached results older than this may be stale.
+    """
+    timestamps = [0.0]
+    for asset_key in [dg.AssetKey("trips_by_hour"), dg.AssetKey("taxi_zones")]:
+        event = context.instance.get_latest_materialization_event(asset_key)
+        if event is not None:
+            timestamps.append(event.timestamp)
+    return max(timestamps)
+
+
+def _fetch_trips_by_borough_and_hour(
+    conn, keys: list[tuple[str, str, str]]
+) -> "pd.DataFrame":
+    """Counts trips by borough, date, hour of day and day of week, once for every request in the batch."""
+    boroughs = ", ".join(f"'{borough}'" for borough in sorted({key[0] for key in keys}))
+    start_date = min(key[1] for key in keys)
+    end_date = max(key[2] for key in keys)
+
+    # Read from the hourly rollup, which already holds the trips counted by hour and zone
     query = f"""
         select
-            date_part('hour', pickup_datetime) as hour_of_day,
-            date_part('dayofweek', pickup_datetime) as day_of_week_num,
-            case date_part('dayofweek', pickup_datetime)
-                when 0 then 'Sunday'
-                when 1 then 'Monday'
-                when 2 then 'Tuesday'
-                when 3 then 'Wednesday'
-                when 4 then 'Thursday'
-                when 5 then 'Friday'
-                when 6 then 'Saturday'
-            end as day_of_week,
-            count(*) as num_trips
-        from trips
-        left join zones on trips.pickup_zone_id = zones.zone_id
-        where pickup_datetime >= '{config.start_date}'
-        and pickup_datetime < '{config.end_date}'
-        and pickup_zone_id in (
-            select zone_id
-            from zones
-            where borough = '{config.borough}'
-        )
-        group by 1, 2
-        order by 1, 2 asc
+            zones.borough,
+            trips_by_hour.pickup_hour::date as pickup_date,
+            date_part('hour', trips_by_hour.pickup_hour) as hour_of_day,
+            date_part('dayofweek', trips_by_hour.pickup_hour) as day_of_week_num,
+            sum(trips_by_hour.num_trips)::bigint as num_trips
+        from trips_by_hour
+        join zones on trips_by_hour.pickup_zone_id = zones.zone_id
+        where trips_by_hour.pickup_hour >= '{start_date}'
+        and trips_by_hour.pickup_hour < '{end_date}'
+        and zones.borough in ({boroughs})
+        group by all
     """
 
-    with database.get_connection() as conn:
-        results = conn.execute(query).fetch_df()
+    return conn.execute(query).fetch_df()
+
+
+def _slice_request(
+    trips_by_borough_and_hour: "pd.DataFrame", key: tuple[str, str, str]
+) -> "pd.DataFrame":
+    """Counts the trips of a single request from the shared pre-aggregate."""
+    import pandas as pd
+
+    borough, start_date, end_date = key
+    in_request = (
+        (trips_by_borough_and_hour["borough"] == borough)
+        & (trips_by_borough_and_hour["pickup_date"] >= pd.Timestamp(start_date))
+        & (trips_by_borough_and_hour["pickup_date"] < pd.Timestamp(end_date))
+    )
+
+    results = (
+        trips_by_borough_and_hour[in_request]
+        .groupby(["hour_of_day", "day_of_week_num"], as_index=False)["num_trips"]
+        .sum()
+        .sort_values(["hour_of_day", "day_of_week_num"])
+    )
+    results["day_of_week"] = results["day_of_week_num"].map(DAYS_OF_WEEK)
+    return results
+
+
+def _plot_request(request: AdhocRequestConfig, results: "pd.DataFrame") -> dict:
+    import matplotlib.pyplot as plt
+
+    # strip the file extension from the filename, and use it as the output filename
+    file_path = constants.REQUEST_DESTINATION_TEMPLATE_FILE_PATH.format(
+        request.filename.split(".")[0]
+    )
 
     fig, ax = plt.subplots(figsize=(10, 6))
 
@@ -70,7 +162,7 @@ def adhoc_request(
     results_pivot.plot(kind="bar", stacked=True, ax=ax, colormap="viridis")
 
     ax.set_title(
-        f"Number of trips by hour of day in {config.borough}, from {config.start_date} to {config.end_date}"
+        f"Number of trips by hour of day in {request.borough}, from {request.start_date} to {request.end_date}"
     )
     ax.set_xlabel("Hour of Day")
     ax.set_ylabel("Number of Trips")
@@ -79,14 +171,64 @@ def adhoc_request(
     plt.xticks(rotation=45)
     plt.tight_layout()
 
-    plt.savefig(file_path)
+    metadata = charts.save_chart(fig, file_path)
     plt.close(fig)
 
-    with open(file_path, "rb") as file:
-        image_data = file.read()
+    return metadata
 
-    # Convert the image data to base64
-    base64_data = base64.b64encode(image_data).decode("utf-8")
-    md_content = f"![Image](data:image/jpeg;base64,{base64_data})"
 
-    return dg.MaterializeResult(metadata={"preview": dg.MetadataValue.md(md_content)})
+@dg.asset(
+    deps=["trips_by_hour", "taxi_zones"],
+    kinds={"python"},
+)
+def adhoc_request(
+    context: dg.AssetExecutionContext,
+    config: AdhocRequestBatchConfig,
+    database: PooledDuckDBResource,
+) -> dg.MaterializeResult:
+    """The responses to the requests made in the `requests` directory.
+    See `requests/README.md` for more information.
+
+    A run answers a batch of requests. Trips are counted by borough, date and hour once for the
+    whole batch from the `trips_by_hour` rollup, then sliced for each request. Results are cached
+    by borough and date range until `trips_by_hour` or `taxi_zones` is materialized again.
+    """
+    valid_after = _latest_upstream_materialization(context)
+
+    results_by_key = {}
+    for key in {_request_key(request) for request in config.requests}:
+        cached = _read_cached_results(key, valid_after)
+        if cached is not None:
+            results_by_key[key] = cached
+
+    missing_keys = sorted(
+        {_request_key(request) for request in config.requests} - set(results_by_key)
+    )
+    query_metadata = {}
+    if missing_keys:
+        with database.get_connection(read_only=True) as conn:
+            trips_by_borough_and_hour = _fetch_trips_by_borough_and_hour(
+                conn, missing_keys
+            )
+        query_metadata = conn.profile.to_metadata()
+
+        computed_at = time.time()
+        for key in missing_keys:
+            results_by_key[key] = _slice_request(trips_by_borough_and_hour, key)
+            _write_cached_results(key, results_by_key[key], computed_at)
+
+    previews = []
+    for request in config.requests:
+        chart_metadata = _plot_request(request, results_by_key[_request_key(request)])
+        previews.append(f"**{request.filename}**\n\n{chart_metadata['preview'].value}")
+
+    return dg.MaterializeResult(
+        metadata={
+            "preview": dg.MetadataValue.md("\n\n".join(previews)),
+            "Number of requests": dg.MetadataValue.int(len(config.requests)),
+            "Cached results": dg.MetadataValue.int(
+                len(results_by_key) - len(missing_keys)
+            ),
+            **query_metadata,
+        }
+    )
@@ -1,14 +1,12 @@
-from io import BytesIO
-
 import dagster as dg
-import pandas as pd
-import requests
-from dagster_duckdb import DuckDBResource
-from smart_open import open
 
-from dagster_and_dbt.defs.assets import constants
+from dagster_and_dbt.defs.assets import constants, downloads
 from dagster_and_dbt.defs.partitions import monthly_partition
-from dagster_and_dbt.defs.resources import smart_open_config
+from dagster_and_dbt.defs.resources import (
+    PooledDuckDBResource,
+    get_s3_transfer_config,
+    get_smart_open_config,
+)
 
 
 @dg.asset(
@@ -17,16 +15,21 @@ from dagster_and_dbt.defs.resources import smart_open_config
 )
 def taxi_zones_file() -> dg.MaterializeResult:
     """The raw CSV file for the taxi zones dataset. Sourced from the NYC Open Data portal."""
-    raw_taxi_zones = requests.get(
-        "https://community-engineering-artifacts.s3.us-west-2.amazonaws.com/dagster-university/data/taxi_zones.csv"
+    # pandas and geopandas are imported when used, to keep them out of the definitions' load time
+    import pandas as pd
+    from smart_open import open
+
+    downloads.stream_to_path(
+        "https://community-engineering-artifacts.s3.us-west-2.amazonaws.com/dagster-university/data/taxi_zones.csv",
+        constants.TAXI_ZONES_FILE_PATH,
+        transport_params=get_smart_open_config(),
+        transfer_config=get_s3_transfer_config(),
     )
 
     with open(
-        constants.TAXI_ZONES_FILE_PATH, "wb", transport_params=smart_open_config
-    ) as output_file:
-        output_file.write(raw_taxi_zones.content)
-
-    num_rows = len(pd.read_csv(BytesIO(raw_taxi_zones.content)))
+        constants.TAXI_ZONES_FILE_PATH, "rb", transport_params=get_smart_open_config()
+    ) as input_file:
+        num_rows = len(pd.read_csv(input_file, usecols=[0]))
 
     return dg.MaterializeResult(
         metadata={"Number of records": dg.MetadataValue.int(num_rows)}
@@ -38,8 +41,14 @@ def taxi_zones_file() -> dg.MaterializeResult:
     group_name="ingested",
     kinds={"duckdb"},
 )
-def taxi_zones(context: dg.AssetExecutionContext, database: DuckDBResource):
-    """The raw taxi zones dataset, loaded into a DuckDB database."""
+def taxi_zones(
+    context: dg.AssetExecutionContext, database: PooledDuckDBResource
+) -> dg.MaterializeResult:
+    """The raw taxi zones dataset, loaded into a DuckDB database.
+    The WKT geometries are also parsed once into WKB, in the `zone_geometries` table.
+    """
+    import geopandas as gpd
+
     query = f"""
         create or replace table zones as (
             select
@@ -54,6 +63,24 @@ def taxi_zones(context: dg.AssetExecutionContext, database: DuckDBResource):
     with database.get_connection() as conn:
         conn.execute(query)
 
+        zone_geometries = conn.execute(
+            "select zone_id, geometry from zones where geometry is not null"
+        ).fetch_df()
+        zone_geometries["geometry"] = gpd.GeoSeries.from_wkt(
+            zone_geometries["geometry"]
+        ).to_wkb()
+
+        conn.register("zone_geometries_df", zone_geometries)
+        conn.execute("""
+            create or replace table zone_geometries as (
+                select zone_id, geometry::blob as geometry
+                from zone_geometries_df
+            );
+        """)
+        conn.unregister("zone_geometries_df")
+
+    return dg.MaterializeResult(metadata=conn.profile.to_metadata())
+
 
 @dg.asset(
     partitions_def=monthly_partition,
@@ -65,50 +92,95 @@ def taxi_trips_file(context: dg.AssetExecutionContext) -> dg.MaterializeResult:
     partition_date_str = context.partition_key
     month_to_fetch = partition_date_str[:-3]
 
-    raw_trips = requests.get(
-        f"https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{month_to_fetch}.parquet"
-    )
+    file_path = constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch)
 
-    with open(
-        constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch),
-        "wb",
-        transport_params=smart_open_config,
-    ) as output_file:
-        output_file.write(raw_trips.content)
+    num_bytes = downloads.stream_to_path(
+        f"https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{month_to_fetch}.parquet",
+        file_path,
+        transport_params=get_smart_open_config(),
+        transfer_config=get_s3_transfer_config(),
+    )
 
-    num_rows = len(pd.read_parquet(BytesIO(raw_trips.content)))
+    num_rows = downloads.parquet_num_rows(
+        file_path, transport_params=get_smart_open_config()
+    )
     return dg.MaterializeResult(
-        metadata={"Number of records": dg.MetadataValue.int(num_rows)}
+        metadata={
+            "Number of records": dg.MetadataValue.int(num_rows),
+            "Size (bytes)": dg.MetadataValue.int(num_bytes),
+        }
     )
 
 
-@dg.asset(
-    deps=["taxi_trips_file"],
-    partitions_def=monthly_partition,
-    group_name="ingested",
-    kinds={"duckdb"},
-)
-def taxi_trips(context: dg.AssetExecutionContext, database: DuckDBResource):
-    """The raw taxi trips dataset, loaded into a DuckDB database, partitioned by month."""
-    partition_date_str = context.partition_key
-    month_to_fetch = partition_date_str[:-3]
+def load_trips_partition(conn, file_path: str, month_to_fetch: str) -> None:
+    """Replaces a month of trips with the trips in a raw parquet file.
 
-    query = f"""
+    The month is written sorted on `pickup_datetime`, so the min/max zone maps DuckDB keeps for
+    each row group let range filters on the pickup time skip the row groups outside the range.
+
+    Args:
+        conn: The DuckDB connection to load the trips with.
+        file_path (str): The path of the raw taxi trips parquet file.
+        month_to_fetch (str): The month of the trips, in the YYYY-MM format.
+    """
+    conn.execute("""
         create table if not exists trips (
             vendor_id integer, pickup_zone_id integer, dropoff_zone_id integer,
             rate_code_id double, payment_type integer, dropoff_datetime timestamp,
             pickup_datetime timestamp, trip_distance double, passenger_count double,
             total_amount double, partition_date varchar
-        );
-
-        delete from trips where partition_date = '{month_to_fetch}';
-    
+        )
+    """)
+    conn.execute(f"delete from trips where partition_date = '{month_to_fetch}'")
+    conn.execute(f"""
         insert into trips
         select
-            VendorID, PULocationID, DOLocationID, RatecodeID, payment_type, tpep_dropoff_datetime, 
+            VendorID, PULocationID, DOLocationID, RatecodeID, payment_type, tpep_dropoff_datetime,
             tpep_pickup_datetime, trip_distance, passenger_count, total_amount, '{month_to_fetch}' as partition_date
-        from '{constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch)}';
+        from '{file_path}'
+        order by tpep_pickup_datetime
+    """)
+
+
+def cluster_trips(conn) -> None:
+    """Rewrites the `trips` table sorted on `pickup_datetime`.
+
+    Each load is sorted, but reloaded months leave gaps behind in the row groups they were
+    deleted from and are appended after the other months. Rewriting the table compacts it and
+    keeps the zone maps on `pickup_datetime` selective across months.
     """
+    conn.execute("create or replace table trips as from trips order by pickup_datetime")
+
+
+class TaxiTripsConfig(dg.Config):
+    # Rewrite the whole table sorted on pickup time after loading the month, which is slower
+    cluster: bool = False
+
+
+@dg.asset(
+    deps=["taxi_trips_file"],
+    partitions_def=monthly_partition,
+    group_name="ingested",
+    kinds={"duckdb"},
+)
+def taxi_trips(
+    context: dg.AssetExecutionContext,
+    config: TaxiTripsConfig,
+    database: PooledDuckDBResource,
+) -> dg.MaterializeResult:
+    """The raw taxi trips dataset, loaded into a DuckDB database, partitioned by month.
+    Each month is sorted on pickup time as it is loaded, see `load_trips_partition`.
+    """
+    partition_date_str = context.partition_key
+    month_to_fetch = partition_date_str[:-3]
 
     with database.get_connection() as conn:
-        conn.execute(query)
+        load_trips_partition(
+            conn,
+            constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch),
+            month_to_fetch,
+        )
+        if config.cluster:
+            cluster_trips(conn)
+
+    return dg.MaterializeResult(metadata=conn.profile.to_metadata())
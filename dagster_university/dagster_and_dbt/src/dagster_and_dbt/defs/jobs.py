@@ -3,12 +3,16 @@ import dagster as dg
 from dagster_and_dbt.defs.partitions import monthly_partition, weekly_partition
 
 trips_by_week = dg.AssetSelection.assets("trips_by_week")
+trips_by_week_csv = dg.AssetSelection.assets("trips_by_week_csv")
 adhoc_request = dg.AssetSelection.assets("adhoc_request")
 
 trip_update_job = dg.define_asset_job(
     name="trip_update_job",
     partitions_def=monthly_partition,
-    selection=dg.AssetSelection.all() - trips_by_week - adhoc_request,
+    selection=dg.AssetSelection.all()
+    - trips_by_week
+    - trips_by_week_csv
+    - adhoc_request,
 )
 
 weekly_update_job = dg.define_asset_job(
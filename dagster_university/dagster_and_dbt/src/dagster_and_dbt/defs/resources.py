@@ -1,22 +1,331 @@
+import json
 import os
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import cache
 
-import boto3
 import dagster as dg
+import duckdb
+from dagster._utils.backoff import backoff
 from dagster_duckdb import DuckDBResource
 
-database_resource = DuckDBResource(
+
+class DuckDBConnectionPool:
+    """The DuckDB connection to one database file shared by every thread of a process.
+
+    DuckDB cursors opened from a single connection share the same database instance, so threads
+    can read concurrently without opening the file again. The connection is opened read-only until
+    something needs to write, and writers are serialized behind a lock, as DuckDB allows a single
+    writer. Opening the file read-only lets several processes read it at the same time, so the
+    read-write connection is closed as soon as its last cursor is, and the next reader reopens the
+    file read-only. This releases the write lock for other processes, like dbt.
+
+    A thread holding a cursor can't open a writer: the connection can only become read-write once
+    every cursor is closed, so it would wait on itself.
+    """
+
+    def __init__(self, database: str, config: dict):
+        self.database = database
+        self.config = config
+        self._connection = None
+        self._read_only = True
+        self._cursors = 0
+        self._upgrading = False
+        self._state = threading.Condition()
+        self._writer = threading.Lock()
+        self._thread_cursors = threading.local()
+
+    def _connect(self, read_only: bool) -> None:
+        # Another process may hold the file lock, so retry like DuckDBResource does
+        self._connection = backoff(
+            fn=duckdb.connect,
+            retry_on=(RuntimeError, duckdb.IOException),
+            kwargs={
+                "database": self.database,
+                "read_only": read_only,
+                "config": self.config,
+            },
+            max_retries=10,
+        )
+        self._read_only = read_only
+
+    def _open_cursor(self, read_only: bool):
+        with self._state:
+            # Readers arriving while a writer waits to reopen the connection would starve it
+            self._state.wait_for(lambda: not self._upgrading)
+
+            if self._connection is not None and self._read_only and not read_only:
+                # DuckDB cannot open a file read-write while this process has it open read-only
+                self._upgrading = True
+                try:
+                    self._state.wait_for(lambda: self._cursors == 0)
+                    self._connection.close()
+                    self._connection = None
+                    self._connect(read_only)
+                finally:
+                    self._upgrading = False
+                    self._state.notify_all()
+
+            if self._connection is None:
+                self._connect(read_only)
+
+            self._cursors += 1
+            return self._connection.cursor()
+
+    def _close_cursor(self, cursor) -> None:
+        cursor.close()
+        with self._state:
+            self._cursors -= 1
+            # An in-memory database holds no file lock, and would be lost with its connection
+            if (
+                self._cursors == 0
+                and not self._read_only
+                and self.database != ":memory:"
+            ):
+                self._connection.close()
+                self._connection = None
+                self._read_only = True
+            self._state.notify_all()
+
+    @contextmanager
+    def _track_thread_cursor(self):
+        self._thread_cursors.count = getattr(self._thread_cursors, "count", 0) + 1
+        try:
+            yield
+        finally:
+            self._thread_cursors.count -= 1
+
+    @contextmanager
+    def cursor(self, read_only: bool):
+        if read_only:
+            with self._track_thread_cursor():
+                cursor = self._open_cursor(read_only=True)
+                try:
+                    yield cursor
+                finally:
+                    self._close_cursor(cursor)
+            return
+
+        if getattr(self._thread_cursors, "count", 0):
+            raise RuntimeError(
+                f"Cannot open a writer on {self.database} while this thread holds another "
+                "connection to it, close that connection first."
+            )
+
+        with self._writer, self._track_thread_cursor():
+            cursor = self._open_cursor(read_only=False)
+            try:
+                yield cursor
+            finally:
+                self._close_cursor(cursor)
+
+
+# The metrics DuckDB collects for every profiled query, see https://duckdb.org/docs/dev/profiling
+PROFILING_METRICS = [
+    "LATENCY",
+    "CUMULATIVE_ROWS_SCANNED",
+    "SYSTEM_PEAK_BUFFER_MEMORY",
+    "OPERATOR_TYPE",
+    "OPERATOR_TIMING",
+]
+
+
+class QueryProfile:
+    """The cost of the queries run on a connection, summed from DuckDB's profiling output."""
+
+    def __init__(self):
+        self.num_queries = 0
+        self.latency = 0.0
+        self.rows_scanned = 0
+        self.peak_buffer_memory = 0
+        self.operator_timings = defaultdict(float)
+
+    def add(self, profile: dict) -> None:
+        # Statements without a query plan, such as DDL, report no metrics, and a result that
+        # was not fetched to the end reports zeros
+        if not profile.get("latency"):
+            return
+
+        self.num_queries += 1
+        self.latency += profile["latency"]
+        self.rows_scanned += profile["cumulative_rows_scanned"]
+        self.peak_buffer_memory = max(
+            self.peak_buffer_memory, profile["system_peak_buffer_memory"]
+        )
+
+        operators = list(profile["children"])
+        while operators:
+            operator = operators.pop()
+            self.operator_timings[operator["operator_type"]] += operator[
+                "operator_timing"
+            ]
+            operators.extend(operator["children"])
+
+    def to_metadata(self) -> dict:
+        """The profile as asset metadata, or nothing if no query was profiled."""
+        if not self.num_queries:
+            return {}
+
+        operators = sorted(
+            self.operator_timings.items(), key=lambda item: item[1], reverse=True
+        )
+        operator_table = "\n".join(
+            [
+                "| Operator | Time (seconds) |",
+                "| --- | --- |",
+                *(f"| {name} | {timing:.4f} |" for name, timing in operators),
+            ]
+        )
+
+        return {
+            "Number of queries": dg.MetadataValue.int(self.num_queries),
+            "Query time (seconds)": dg.MetadataValue.float(self.latency),
+            "Rows scanned": dg.MetadataValue.int(self.rows_scanned),
+            "Peak buffer memory (bytes)": dg.MetadataValue.int(self.peak_buffer_memory),
+            "Query operators": dg.MetadataValue.md(operator_table),
+        }
+
+
+class ProfiledConnection:
+    """A DuckDB cursor that records the profile of every query it executes into `profile`.
+
+    DuckDB writes the profile of a query to the cursor's `profiling_output` file once its result
+    has been consumed, and the file is read when the next query is executed or the connection is
+    closed. Queries whose result is not fetched to the end, with `fetchone` for example, write no
+    profile and are left out. Only the last statement of a multi-statement query is profiled.
+    """
+
+    def __init__(self, cursor, enabled: bool = True):
+        self._cursor = cursor
+        self._enabled = enabled
+        self._pending = False
+        self._profiling_output = None
+        self.profile = QueryProfile()
+
+        if enabled:
+            fd, self._profiling_output = tempfile.mkstemp(suffix=".json")
+            os.close(fd)
+            os.remove(self._profiling_output)
+
+            settings = json.dumps({metric: "true" for metric in PROFILING_METRICS})
+            cursor.execute("set enable_profiling = 'json'")
+            cursor.execute(f"set profiling_output = '{self._profiling_output}'")
+            cursor.execute(f"set custom_profiling_settings = '{settings}'")
+
+    def _collect(self) -> None:
+        if not self._enabled:
+            return
+
+        pending, self._pending = self._pending, False
+        try:
+            with open(self._profiling_output) as profiling_output:
+                profile = json.load(profiling_output)
+        except FileNotFoundError:
+            return
+        os.remove(self._profiling_output)
+
+        if pending:
+            self.profile.add(profile)
+
+    def execute(self, *args, **kwargs) -> "ProfiledConnection":
+        self._collect()
+        self._cursor.execute(*args, **kwargs)
+        # Only set once the query succeeded, a failed query is not profiled
+        self._pending = True
+        return self
+
+    def close(self) -> None:
+        self._collect()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+_pools: dict[tuple[int, str], DuckDBConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+class PooledDuckDBResource(DuckDBResource):
+    """A DuckDB resource that reuses one connection per database for the life of the process.
+
+    `get_connection` hands out cursors of the pooled connection instead of connecting each time.
+    Read-only assets pass `read_only=True`, which lets parallel runs read the database at the same
+    time. Writers are serialized within the process, and the file is reopened read-only once they
+    are done, so other processes, like dbt, can write to it in between.
+
+    Queries are profiled by DuckDB unless `profile_queries` is false. The connection exposes their
+    summed `profile`, which assets add to their metadata with `conn.profile.to_metadata()`.
+    """
+
+    profile_queries: bool = True
+
+    def _pool(self) -> DuckDBConnectionPool:
+        # Keyed by process id, as a forked process must not reuse its parent's connection
+        key = (os.getpid(), os.path.abspath(self.database))
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = DuckDBConnectionPool(
+                    self.database,
+                    {"custom_user_agent": "dagster", **self.connection_config},
+                )
+            return _pools[key]
+
+    @contextmanager
+    def get_connection(self, read_only: bool = False):
+        # An in-memory database only exists within its connection, so it is never read-only
+        read_only = read_only and self.database != ":memory:"
+        with self._pool().cursor(read_only) as cursor:
+            conn = ProfiledConnection(cursor, enabled=self.profile_queries)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+
+database_resource = PooledDuckDBResource(
     database=dg.EnvVar("DUCKDB_DATABASE"),
 )
 
-if os.getenv("DAGSTER_ENVIRONMENT") == "prod":
+# Size of the parts of multipart uploads to S3, and the number of parts uploaded at once
+S3_MULTIPART_PART_SIZE_MB = int(os.getenv("S3_MULTIPART_PART_SIZE_MB", "16"))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+
+
+# The S3 configs are built on first use, so loading the definitions doesn't import boto3
+@cache
+def get_s3_transfer_config():
+    """The part size and concurrency of the multipart uploads to S3."""
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=S3_MULTIPART_PART_SIZE_MB * 1024 * 1024,
+        multipart_chunksize=S3_MULTIPART_PART_SIZE_MB * 1024 * 1024,
+        max_concurrency=S3_MAX_CONCURRENCY,
+    )
+
+
+@cache
+def get_smart_open_config() -> dict:
+    """The smart_open transport params, with the S3 client shared by every upload in prod."""
+    if os.getenv("DAGSTER_ENVIRONMENT") != "prod":
+        return {}
+
+    import boto3
+    from botocore.config import Config as BotocoreConfig
+
     session = boto3.Session(
         aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
         aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
         region_name=os.getenv("AWS_REGION"),
     )
-    smart_open_config = {"client": session.client("s3")}
-else:
-    smart_open_config = {}
+    # A single client is shared by every upload, its connection pool fits the concurrent parts
+    s3_client = session.client(
+        "s3",
+        config=BotocoreConfig(max_pool_connections=max(10, S3_MAX_CONCURRENCY)),
+    )
+    return {"client": s3_client}
 
 
 @dg.definitions
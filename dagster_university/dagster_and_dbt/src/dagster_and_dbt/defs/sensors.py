@@ -1,3 +1,6 @@
+from __future__ import annotations
+
+import hashlib
 import json
 import os
 
@@ -5,46 +8,124 @@ import dagster as dg
 
 from dagster_and_dbt.defs.jobs import adhoc_request_job
 
+PATH_TO_REQUESTS = os.path.join(
+    os.path.dirname(__file__),
+    "../../../",
+    "data/requests",
+)
+
+# Upper bound on the requests picked up by a single tick, the rest wait for the next ticks
+MAX_REQUESTS_PER_TICK = int(
+    os.getenv("ADHOC_REQUEST_SENSOR_MAX_REQUESTS_PER_TICK", "100")
+)
+
+
+def load_cursor(cursor: str | None) -> dict:
+    """Parses the sensor cursor, migrating the cursor of earlier versions of the sensor.
+
+    Earlier versions stored the modification time of every file they processed, keyed by filename.
+    Such a cursor becomes a high-water mark at its latest modification time, so files already
+    processed are not requested again.
+    """
+    state = json.loads(cursor) if cursor else {}
+    if not state or "mtime" in state:
+        return state
+
+    high_water_mark = max(state.values())
+    return {
+        "mtime": high_water_mark,
+        "names": sorted(
+            filename
+            for filename, last_modified in state.items()
+            if last_modified == high_water_mark
+        ),
+    }
+
+
+def scan_requests(
+    path: str, cursor: dict, max_requests: int
+) -> tuple[list[tuple[float, str]], dict]:
+    """Finds the request files that are new or modified since the cursor was written.
+
+    The cursor is a high-water mark rather than a record of every file: the latest modification
+    time processed so far, plus the names of the files processed with exactly that time. Its size
+    stays bounded however many files the directory holds. A file copied in with a modification time
+    older than the high-water mark is not picked up.
+
+    Args:
+        path (str): The directory holding the request files.
+        cursor (dict): The cursor returned by the previous scan, or an empty dict.
+        max_requests (int): The maximum number of requests to return.
+
+    Returns:
+        pending (list): The (modification time, filename) of the requests to process, oldest first.
+        cursor (dict): The cursor to store once the pending requests are submitted.
+    """
+    high_water_mark = cursor.get("mtime", 0.0)
+    names_at_mark = set(cursor.get("names", []))
+
+    pending = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json") or not entry.is_file():
+                continue
+
+            last_modified = entry.stat().st_mtime
+            if last_modified > high_water_mark or (
+                last_modified == high_water_mark and entry.name not in names_at_mark
+            ):
+                pending.append((last_modified, entry.name))
+
+    pending = sorted(pending)[:max_requests]
+
+    for last_modified, filename in pending:
+        if last_modified > high_water_mark:
+            high_water_mark = last_modified
+            names_at_mark = set()
+        names_at_mark.add(filename)
+
+    return pending, {"mtime": high_water_mark, "names": sorted(names_at_mark)}
+
 
 @dg.sensor(job=adhoc_request_job)
 def adhoc_request_sensor(context: dg.SensorEvaluationContext):
-    PATH_TO_REQUESTS = os.path.join(
-        os.path.dirname(__file__),
-        "../../../",
-        "data/requests",
-    )
+    if not os.path.isdir(PATH_TO_REQUESTS):
+        return dg.SkipReason(f"No requests directory at {PATH_TO_REQUESTS}")
 
-    previous_state = json.loads(context.cursor) if context.cursor else {}
-    current_state = {}
-    runs_to_request = []
+    previous_state = load_cursor(context.cursor)
+    pending, current_state = scan_requests(
+        PATH_TO_REQUESTS, previous_state, MAX_REQUESTS_PER_TICK
+    )
 
-    for filename in os.listdir(PATH_TO_REQUESTS):
-        file_path = os.path.join(PATH_TO_REQUESTS, filename)
-        if filename.endswith(".json") and os.path.isfile(file_path):
-            last_modified = os.path.getmtime(file_path)
+    pending_requests = []
+    for last_modified, filename in pending:
+        with open(os.path.join(PATH_TO_REQUESTS, filename)) as f:
+            request_config = json.load(f)
 
-            current_state[filename] = last_modified
+        pending_requests.append(
+            (last_modified, {"filename": filename, **request_config})
+        )
 
-            # if the file is new or has been modified since the last run, add it to the request queue
-            if (
-                filename not in previous_state
-                or previous_state[filename] != last_modified
-            ):
-                with open(file_path) as f:
-                    request_config = json.load(f)
-
-                runs_to_request.append(
-                    dg.RunRequest(
-                        run_key=f"adhoc_request_{filename}_{last_modified}",
-                        run_config={
-                            "ops": {
-                                "adhoc_request": {
-                                    "config": {"filename": filename, **request_config}
-                                }
+    runs_to_request = []
+    if pending_requests:
+        # every pending request is answered by a single run, which shares work across them
+        batch_key = hashlib.sha256(
+            json.dumps(pending_requests, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        runs_to_request.append(
+            dg.RunRequest(
+                run_key=f"adhoc_request_{batch_key}",
+                run_config={
+                    "ops": {
+                        "adhoc_request": {
+                            "config": {
+                                "requests": [request for _, request in pending_requests]
                             }
-                        },
-                    )
-                )
+                        }
+                    }
+                },
+            )
+        )
 
     return dg.SensorResult(
         run_requests=runs_to_request, cursor=json.dumps(current_state)
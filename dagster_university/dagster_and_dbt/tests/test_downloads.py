@@ -0,0 +1,60 @@
+import functools
+import threading
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from moto import mock_aws
+
+from dagster_and_dbt.defs.assets import downloads
+
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture()
+def served_file(tmp_path):
+    """A file of a few multipart upload parts, served over HTTP from a local server"""
+    payload = bytes(range(256)) * (3 * PART_SIZE // 256 + 1000)
+    (tmp_path / "taxi_trips.parquet").write_bytes(payload)
+
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}/taxi_trips.parquet", payload
+
+    server.shutdown()
+    thread.join()
+
+
+@mock_aws
+def test_stream_to_path_uploads_to_s3_in_parts(served_file):
+    url, payload = served_file
+    client = boto3.client("s3", region_name="us-east-1")
+    client.create_bucket(Bucket="dagster-university")
+
+    num_bytes = downloads.stream_to_path(
+        url,
+        "s3://dagster-university/data/raw/taxi_trips_2023-01.parquet",
+        transport_params={"client": client},
+        transfer_config=TransferConfig(
+            multipart_threshold=PART_SIZE,
+            multipart_chunksize=PART_SIZE,
+            max_concurrency=4,
+        ),
+    )
+
+    assert num_bytes == len(payload)
+
+    # The ETag of an object uploaded in parts ends with the number of parts
+    uploaded = client.head_object(
+        Bucket="dagster-university", Key="data/raw/taxi_trips_2023-01.parquet"
+    )
+    assert uploaded["ETag"].strip('"').endswith("-4")
+
+    uploaded = client.get_object(
+        Bucket="dagster-university", Key="data/raw/taxi_trips_2023-01.parquet"
+    )
+    assert uploaded["Body"].read() == payload
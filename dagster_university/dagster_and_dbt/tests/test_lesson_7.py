@@ -22,6 +22,8 @@ def test_trips_partitioned_assets(setup_dbt_env):  # noqa: F811
         trips.taxi_zones_file,
         trips.taxi_trips,
         trips.taxi_zones,
+        # The source of the dbt daily_metrics model, built by the test below
+        metrics.trips_by_hour,
         metrics.manhattan_stats,
         metrics.manhattan_map,
         metrics.airport_trips,
@@ -80,3 +82,266 @@ def test_defs(setup_dbt_env):  # noqa: F811
     assert dg.Definitions.merge(
         dg.components.load_defs(dagster_and_dbt.completed.lesson_7.defs)
     )
+
+
+@pytest.mark.parametrize("setup_dbt_env", ["lesson_7"], indirect=True)
+def test_incremental_dbt_models_backfill_in_a_single_run(setup_dbt_env):  # noqa: F811
+    from dagster_and_dbt.completed.lesson_7.defs.assets.dbt import (
+        incremental_dbt_models,
+    )
+
+    assert incremental_dbt_models.backfill_policy == dg.BackfillPolicy.single_run()
+
+
+RUN_RESULTS = {
+    "elapsed_time": 3.5,
+    "results": [
+        {
+            "unique_id": "model.analytics.stg_trips",
+            "status": "success",
+            "execution_time": 0.5,
+            "adapter_response": {"rows_affected": 10},
+        },
+        {
+            "unique_id": "model.analytics.daily_metrics",
+            "status": "success",
+            "execution_time": 2.0,
+            "adapter_response": {"rows_affected": 3, "bytes_processed": 2048},
+        },
+        {
+            "unique_id": "test.analytics.not_null_stg_trips_vendor_id",
+            "status": "pass",
+            "execution_time": 1.0,
+            "adapter_response": {},
+        },
+    ],
+}
+
+
+@pytest.mark.parametrize("setup_dbt_env", ["lesson_7"], indirect=True)
+def test_summarize_run_results(setup_dbt_env):  # noqa: F811
+    from dagster_and_dbt.completed.lesson_7.defs.assets.dbt import (
+        summarize_run_results,
+    )
+
+    summary = summarize_run_results(RUN_RESULTS, top_n=2)
+
+    assert summary.splitlines() == [
+        "dbt ran 3 node(s) in 3.50s, slowest first:",
+        "  model.analytics.daily_metrics: success, 2.00s, 3 rows, 2048 bytes",
+        "  test.analytics.not_null_stg_trips_vendor_id: pass, 1.00s",
+    ]
+
+
+@pytest.mark.parametrize("setup_dbt_env", ["lesson_7"], indirect=True)
+def test_run_result_metadata(setup_dbt_env):  # noqa: F811
+    from dagster_and_dbt.completed.lesson_7.defs.assets.dbt import run_result_metadata
+
+    stg_trips, daily_metrics, _ = RUN_RESULTS["results"]
+
+    assert {
+        key: value.value for key, value in run_result_metadata(stg_trips).items()
+    } == {
+        "dbt status": "success",
+        "Execution time (seconds)": 0.5,
+        "Rows affected": 10,
+    }
+    assert run_result_metadata(daily_metrics)["Bytes processed"].value == 2048
+
+
+@pytest.mark.parametrize("setup_dbt_env", ["lesson_7"], indirect=True)
+def test_with_run_results(setup_dbt_env):  # noqa: F811
+    from dagster_and_dbt.completed.lesson_7.defs.assets.dbt import with_run_results
+
+    events = [
+        dg.Output(
+            None, "stg_trips", metadata={"unique_id": "model.analytics.stg_trips"}
+        ),
+        dg.AssetObservation(asset_key="stg_trips"),
+        dg.Output(
+            None,
+            "daily_metrics",
+            metadata={"unique_id": "model.analytics.daily_metrics"},
+        ),
+    ]
+
+    stg_trips, observation, daily_metrics = with_run_results(events, RUN_RESULTS)
+
+    assert observation is events[1]
+    assert stg_trips.metadata["Rows affected"].value == 10
+    assert daily_metrics.metadata["Bytes processed"].value == 2048
+    # Every output carries the summary of the whole invocation
+    assert (
+        stg_trips.metadata["dbt run summary"]
+        == daily_metrics.metadata["dbt run summary"]
+    )
+    assert stg_trips.metadata["dbt run summary"].value.startswith("dbt ran 3 node(s)")
+
+
+@pytest.mark.parametrize("setup_dbt_env", ["lesson_7"], indirect=True)
+def test_render_chart_in_a_worker(setup_dbt_env, tmp_path, monkeypatch):  # noqa: F811
+    import multiprocessing
+
+    import pyarrow as pa
+
+    from dagster_and_dbt.completed.lesson_7.defs.assets import charts
+
+    monkeypatch.setattr(charts, "CHART_RENDER_WORKERS", 1)
+    table = pa.table({"zone": ["JFK", "LGA"], "Queens": [3, 5], "Bronx": [None, 1]})
+    file_path = str(tmp_path / "chart.png")
+
+    try:
+        metadata = charts.render(
+            charts.stacked_bar_chart,
+            table,
+            file_path,
+            title="Trips",
+            xlabel="Zone",
+            ylabel="Trips",
+            legend_title="Borough",
+        )
+    finally:
+        charts.shutdown_render_pool()
+
+    assert (
+        metadata["Image size (bytes)"].value == (tmp_path / "chart.png").stat().st_size
+    )
+    assert metadata["preview"].value.startswith("![Image](data:image/png;base64,")
+    assert not multiprocessing.active_children()
+
+
+# Relative to the root of the project, like the default database
+INCREMENTAL_DATABASE = "data/staging/incremental.duckdb"
+
+
+def _insert_trips(conn, day: str, num_trips: int, minutes: int = 10) -> None:
+    conn.execute(f"""
+        insert into trips
+        select
+            1, i % 5, i % 7, 1, 1,
+            '{day}'::timestamp + to_minutes(i * 20 + {minutes}),
+            '{day}'::timestamp + to_minutes(i * 20),
+            1.5, 1, 10.0, strftime('{day}'::date, '%Y-%m')
+        from range({num_trips}) as t(i)
+    """)
+
+
+@pytest.fixture()
+def incremental_database(monkeypatch):
+    """A database of its own for dbt, holding zones and trips for the first two days of March"""
+    import duckdb
+
+    monkeypatch.setenv("DUCKDB_DATABASE", INCREMENTAL_DATABASE)
+    path = Path(__file__).absolute().parent.parent / INCREMENTAL_DATABASE
+    path.unlink(missing_ok=True)
+
+    conn = duckdb.connect(str(path))
+    conn.execute("""
+        create table zones as
+        select * from (values
+            (0, 'Midtown Center', 'Manhattan'),
+            (1, 'JFK Airport', 'Queens'),
+            (2, 'Astoria', 'Queens'),
+            (3, 'Park Slope', 'Brooklyn'),
+            (4, 'Mott Haven', 'Bronx'),
+            (5, 'Newark Airport', 'EWR'),
+            (6, 'St. George', 'Staten Island')
+        ) as t(zone_id, zone, borough)
+    """)
+    conn.execute("""
+        create table trips (
+            vendor_id integer, pickup_zone_id integer, dropoff_zone_id integer,
+            rate_code_id double, payment_type integer, dropoff_datetime timestamp,
+            pickup_datetime timestamp, trip_distance double, passenger_count double,
+            total_amount double, partition_date varchar
+        )
+    """)
+    _insert_trips(conn, "2023-03-01", 50)
+    _insert_trips(conn, "2023-03-02", 50)
+    # Picked up before the month of its file, it is loaded with the first day of the month
+    _insert_trips(conn, "2023-02-28", 1)
+    conn.execute("update trips set partition_date = '2023-03'")
+    conn.close()
+
+    yield path
+
+    path.unlink(missing_ok=True)
+
+
+def _dbt_build(select: str, *args: str, **dbt_vars) -> None:
+    import json
+
+    from dagster_and_dbt.completed.lesson_7.defs.project import load_manifest
+    from dagster_and_dbt.completed.lesson_7.defs.resources import dbt_resource
+
+    dbt_resource.cli(
+        ["build", "--select", select, "--vars", json.dumps(dbt_vars), *args],
+        manifest=load_manifest(),
+    ).wait()
+
+
+@pytest.mark.parametrize("setup_dbt_env", ["lesson_7"], indirect=True)
+@pytest.mark.parametrize("trip_id_type", ["md5", "integer"])
+def test_stg_trips_incremental_matches_full_refresh(
+    setup_dbt_env,  # noqa: F811
+    incremental_database,
+    trip_id_type,
+):
+    import duckdb
+
+    def build_stg_trips(*args, **dbt_vars):
+        _dbt_build("stg_trips", *args, trip_id_type=trip_id_type, **dbt_vars)
+
+        with duckdb.connect(str(incremental_database), read_only=True) as conn:
+            return conn.execute("select * from stg_trips order by all").fetchall()
+
+    build_stg_trips("--full-refresh")
+
+    with duckdb.connect(str(incremental_database)) as conn:
+        # The trips of the 2nd are corrected, which changes their trip_id
+        conn.execute("delete from trips where pickup_datetime >= '2023-03-02'")
+        _insert_trips(conn, "2023-03-02", 50, minutes=15)
+        _insert_trips(conn, "2023-03-03", 50)
+
+    # Two daily partitions, each replacing the trips of its own day
+    build_stg_trips(min_date="2023-03-02", max_date="2023-03-03")
+    incremental = build_stg_trips(min_date="2023-03-03", max_date="2023-03-04")
+
+    assert len(incremental) == 151
+    assert incremental == build_stg_trips("--full-refresh")
+
+
+@pytest.mark.parametrize("setup_dbt_env", ["lesson_7"], indirect=True)
+def test_location_metrics_incremental_matches_full_refresh(
+    setup_dbt_env,  # noqa: F811
+    incremental_database,
+):
+    import duckdb
+
+    def build_location_metrics(*args, **dbt_vars):
+        # Builds stg_zones and stg_trips too, and runs the tests of the models
+        _dbt_build("+location_metrics", *args, **dbt_vars)
+
+        with duckdb.connect(str(incremental_database), read_only=True) as conn:
+            return conn.execute(
+                "select * from location_metrics order by all"
+            ).fetchall()
+
+    build_location_metrics("--full-refresh")
+
+    with duckdb.connect(str(incremental_database)) as conn:
+        # Longer trips on the 2nd, and a new day of trips on the 3rd
+        conn.execute("delete from trips where pickup_datetime >= '2023-03-02'")
+        _insert_trips(conn, "2023-03-02", 50, minutes=45)
+        _insert_trips(conn, "2023-03-03", 50)
+
+    build_location_metrics(min_date="2023-03-02", max_date="2023-03-03")
+    incremental = build_location_metrics(min_date="2023-03-03", max_date="2023-03-04")
+
+    assert {row[0].isoformat() for row in incremental} == {
+        "2023-02-28",
+        "2023-03-01",
+        "2023-03-02",
+        "2023-03-03",
+    }
+    assert incremental == build_location_metrics("--full-refresh")
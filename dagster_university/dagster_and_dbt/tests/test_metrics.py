@@ -0,0 +1,141 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import dagster as dg
+import duckdb
+import geopandas as gpd
+import pandas as pd
+import pytest
+
+from dagster_and_dbt.defs.assets import constants, metrics
+from dagster_and_dbt.defs.resources import PooledDuckDBResource
+
+SOURCE_TAXI_ZONES_FILE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data", "source", "taxi_zones.csv"
+)
+
+CREATE_TRIPS_QUERY = """
+    create table trips as
+    select
+        (i % 3)::integer as vendor_id,
+        (i % 3 + 4)::integer as pickup_zone_id,
+        timestamp '2023-01-01' + to_hours(i) as pickup_datetime,
+        timestamp '2023-01-01' + to_hours(i) + to_minutes(i % 45) as dropoff_datetime,
+        i / 7.0 as total_amount,
+        i / 3.0 as trip_distance,
+        (i % 4)::double as passenger_count,
+        '2023-01' as partition_date
+    from range(24 * 14) as t(i)
+"""
+
+
+@pytest.fixture()
+def trips_conn():
+    conn = duckdb.connect()
+    conn.execute(CREATE_TRIPS_QUERY)
+    metrics.load_trips_by_hour(conn, "2023-01")
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("period", ["2023-01-01", "2023-01-08", "2023-02-05"])
+def test_trips_by_week_aggregation_paths_match(trips_conn, period):
+    in_memory = metrics.aggregate_trips_by_week_in_memory(trips_conn, period)
+    in_database = metrics.aggregate_trips_by_week_in_database(trips_conn, period)
+
+    pd.testing.assert_frame_equal(
+        in_memory.reset_index(drop=True), in_database, check_dtype=False
+    )
+
+
+def test_trips_by_week_aggregation_paths_skip_trips_without_vendor(trips_conn):
+    trips_conn.execute("""
+        insert into trips
+        select null, 4, timestamp '2023-01-02 10:30', timestamp '2023-01-02 10:50',
+            5.0, 1.0, 1.0, '2023-01'
+    """)
+    metrics.load_trips_by_hour(trips_conn, "2023-01")
+
+    in_memory = metrics.aggregate_trips_by_week_in_memory(trips_conn, "2023-01-01")
+    in_database = metrics.aggregate_trips_by_week_in_database(trips_conn, "2023-01-01")
+
+    pd.testing.assert_frame_equal(
+        in_memory.reset_index(drop=True), in_database, check_dtype=False
+    )
+    assert list(in_database["num_trips"]) == [168]
+
+
+@pytest.fixture()
+def trips_database(tmp_path, monkeypatch):
+    """Run from an empty project directory with a DuckDB database holding two weeks of trips"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.dirname(constants.TRIPS_BY_WEEK_FILE_PATH))
+
+    database = PooledDuckDBResource(database=str(tmp_path / "data.duckdb"))
+    with database.get_connection() as conn:
+        conn.execute(CREATE_TRIPS_QUERY)
+    return database
+
+
+def test_trips_by_week_partitions_run_in_parallel(trips_database):
+    result = dg.materialize(
+        assets=[metrics.trips_by_hour],
+        resources={"database": trips_database},
+        partition_key="2023-01-01",
+    )
+    assert result.success
+    metadata = result.asset_materializations_for_node("trips_by_hour")[0].metadata
+    assert metadata["Number of records"].value == 24 * 14
+
+    def materialize_week(partition_key):
+        return dg.materialize(
+            assets=[metrics.trips_by_week],
+            resources={"database": trips_database},
+            partition_key=partition_key,
+        )
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(materialize_week, ["2023-01-01", "2023-01-08"]))
+    assert all(result.success for result in results)
+
+    # Rematerializing a week replaces its row
+    assert materialize_week("2023-01-08").success
+
+    result = dg.materialize(
+        assets=[metrics.trips_by_week_csv],
+        resources={"database": trips_database},
+    )
+    assert result.success
+
+    trips_by_week = pd.read_csv(constants.TRIPS_BY_WEEK_FILE_PATH)
+    assert list(trips_by_week["period"]) == ["2023-01-01", "2023-01-08"]
+    assert list(trips_by_week["num_trips"]) == [168, 168]
+
+
+def test_manhattan_stats_and_map(trips_database, tmp_path):
+    from dagster_and_dbt.defs.assets import trips
+
+    os.makedirs(os.path.dirname(constants.TAXI_ZONES_FILE_PATH))
+    shutil.copy(SOURCE_TAXI_ZONES_FILE_PATH, constants.TAXI_ZONES_FILE_PATH)
+    os.makedirs(os.path.dirname(constants.MANHATTAN_STATS_FILE_PATH))
+    result = dg.materialize(
+        assets=[trips.taxi_zones, metrics.manhattan_stats, metrics.manhattan_map],
+        resources={"database": trips_database},
+    )
+    assert result.success
+
+    manhattan_stats = gpd.read_parquet(constants.MANHATTAN_STATS_FILE_PATH)
+    assert sorted(manhattan_stats["num_trips"]) == [112, 112, 112]
+    assert manhattan_stats.geometry.notna().all()
+
+    stats_metadata = result.asset_materializations_for_node(
+        "manhattan__manhattan_stats"
+    )[0].metadata
+    assert stats_metadata["Rows scanned"].value >= 336
+
+    metadata = result.asset_materializations_for_node("manhattan_map")[0].metadata
+    image_size = os.path.getsize(constants.MANHATTAN_MAP_FILE_PATH)
+    assert metadata["Image size (bytes)"].value == image_size
+    # The inlined preview is a thumbnail, much smaller than the saved image
+    assert len(metadata["preview"].value) < image_size / 2
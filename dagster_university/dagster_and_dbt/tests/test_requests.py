@@ -0,0 +1,106 @@
+import os
+
+import dagster as dg
+import pytest
+
+from dagster_and_dbt.defs.assets import constants, metrics, requests
+from dagster_and_dbt.defs.resources import PooledDuckDBResource
+
+
+@pytest.fixture()
+def trips_database(tmp_path, monkeypatch):
+    """Run from an empty project directory with a DuckDB database holding trips and zones"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.dirname(constants.REQUEST_DESTINATION_TEMPLATE_FILE_PATH))
+    os.makedirs(os.path.dirname(constants.REQUEST_CACHE_TEMPLATE_FILE_PATH))
+
+    database = PooledDuckDBResource(database=str(tmp_path / "data.duckdb"))
+    with database.get_connection() as conn:
+        conn.execute("""
+            create table zones as
+            select * from (values
+                (1, 'Newark Airport', 'EWR'),
+                (2, 'Jamaica Bay', 'Queens'),
+                (3, 'Allerton/Pelham Gardens', 'Bronx')
+            ) as t(zone_id, zone, borough)
+        """)
+        conn.execute("""
+            create table trips as
+            select
+                *,
+                1 as vendor_id,
+                pickup_datetime + interval 12 minute as dropoff_datetime,
+                1.5 as trip_distance,
+                1.0 as passenger_count,
+                10.0 as total_amount,
+                strftime(pickup_datetime, '%Y-%m') as partition_date
+            from (
+                select
+                    (i % 3 + 1)::integer as pickup_zone_id,
+                    timestamp '2023-01-01' + to_minutes(i * 7) as pickup_datetime
+                from range(10000) as t(i)
+            )
+        """)
+        for month in ["2023-01", "2023-02"]:
+            metrics.load_trips_by_hour(conn, month)
+    return database
+
+
+def _request(filename, borough, start_date, end_date):
+    return {
+        "filename": filename,
+        "borough": borough,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+
+def _expected_counts(database, borough, start_date, end_date):
+    with database.get_connection() as conn:
+        return conn.execute(f"""
+            select
+                date_part('hour', pickup_datetime) as hour_of_day,
+                date_part('dayofweek', pickup_datetime) as day_of_week_num,
+                count(*) as num_trips
+            from trips
+            join zones on trips.pickup_zone_id = zones.zone_id
+            where pickup_datetime >= '{start_date}'
+            and pickup_datetime < '{end_date}'
+            and borough = '{borough}'
+            group by 1, 2
+            order by 1, 2
+        """).fetchall()
+
+
+def test_adhoc_request_batch_is_cached(trips_database):
+    batch = [
+        _request("queens.json", "Queens", "2023-01-03", "2023-01-10"),
+        _request("bronx.json", "Bronx", "2023-01-05", "2023-01-20"),
+        _request("queens-again.json", "Queens", "2023-01-03", "2023-01-10"),
+    ]
+    run_config = {"ops": {"adhoc_request": {"config": {"requests": batch}}}}
+
+    for expected_cached in [0, 2]:
+        result = dg.materialize(
+            assets=[requests.adhoc_request],
+            resources={"database": trips_database},
+            run_config=run_config,
+        )
+        assert result.success
+
+        metadata = result.asset_materializations_for_node("adhoc_request")[0].metadata
+        assert metadata["Number of requests"].value == 3
+        assert metadata["Cached results"].value == expected_cached
+
+    for request in batch:
+        key = (request["borough"], request["start_date"], request["end_date"])
+        results = requests._read_cached_results(key, valid_after=0)
+        assert [
+            tuple(row)
+            for row in results[["hour_of_day", "day_of_week_num", "num_trips"]].values
+        ] == _expected_counts(trips_database, *key)
+        assert os.path.exists(
+            constants.REQUEST_DESTINATION_TEMPLATE_FILE_PATH.format(
+                request["filename"].split(".")[0]
+            )
+        )
@@ -0,0 +1,119 @@
+import threading
+
+import duckdb
+import pytest
+
+from dagster_and_dbt.defs.resources import PooledDuckDBResource
+
+
+@pytest.fixture()
+def database(tmp_path):
+    database = PooledDuckDBResource(database=str(tmp_path / "data.duckdb"))
+    with database.get_connection() as conn:
+        conn.execute("create table trips as select * from range(100) as t(i)")
+    return database
+
+
+def test_readers_share_one_connection(tmp_path):
+    database = PooledDuckDBResource(database=str(tmp_path / "data.duckdb"))
+    duckdb.connect(database.database).execute(
+        "create table trips as select * from range(100) as t(i)"
+    ).close()
+
+    barrier = threading.Barrier(4)
+    counts = []
+
+    def read():
+        with database.get_connection(read_only=True) as conn:
+            # Every reader holds its cursor at the same time
+            barrier.wait(timeout=10)
+            counts.append(conn.execute("select count(*) from trips").fetchone()[0])
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counts == [100] * 4
+
+    # The pooled connection was opened read-only
+    with database.get_connection(read_only=True) as conn:  # noqa: SIM117
+        with pytest.raises(duckdb.InvalidInputException):
+            conn.execute("insert into trips values (100)")
+
+    # A writer reopens it read-write, and readers share the writer's connection until it closes
+    with database.get_connection() as writer:
+        writer.execute("insert into trips values (100)")
+        with database.get_connection(read_only=True) as conn:
+            assert conn.execute("select count(*) from trips").fetchone() == (101,)
+
+    # Then the next reader reopens it read-only
+    with database.get_connection(read_only=True) as conn:  # noqa: SIM117
+        with pytest.raises(duckdb.InvalidInputException):
+            conn.execute("insert into trips values (101)")
+
+
+def test_writers_are_serialized(database):
+    def write():
+        with database.get_connection() as conn:
+            conn.execute(
+                "create table if not exists counter as select 0 as value; "
+                "update counter set value = value + 1"
+            )
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with database.get_connection(read_only=True) as conn:
+        assert conn.execute("select value from counter").fetchone() == (8,)
+
+
+def test_file_is_released_after_writing(database):
+    with database.get_connection() as conn:
+        conn.execute("insert into trips values (100)")
+
+    # Another connection, like dbt's, can write to the file once the writer is done
+    other = duckdb.connect(database.database)
+    other.execute("insert into trips values (101)")
+    other.close()
+
+    with database.get_connection(read_only=True) as conn:
+        assert conn.execute("select count(*) from trips").fetchone() == (102,)
+
+
+def test_reader_cannot_open_a_writer(database):
+    with database.get_connection(read_only=True):  # noqa: SIM117
+        # Waiting for the connection to become read-write would deadlock on this reader
+        with pytest.raises(RuntimeError, match="Cannot open a writer"):
+            with database.get_connection():
+                pass
+
+    # The pool is left usable
+    with database.get_connection() as conn:
+        conn.execute("insert into trips values (100)")
+    with database.get_connection(read_only=True) as conn:
+        assert conn.execute("select count(*) from trips").fetchone() == (101,)
+
+
+def test_queries_are_profiled(database):
+    with database.get_connection(read_only=True) as conn:
+        conn.execute("select sum(i) from trips").fetchall()
+        conn.execute("select i % 10, count(*) from trips group by all").fetch_df()
+        # A failed query is not profiled
+        with pytest.raises(duckdb.CatalogException):
+            conn.execute("select * from missing")
+
+    metadata = conn.profile.to_metadata()
+    assert metadata["Number of queries"].value == 2
+    assert metadata["Rows scanned"].value == 200
+    assert "HASH_GROUP_BY" in metadata["Query operators"].value
+
+    unprofiled = database.model_copy(update={"profile_queries": False})
+    with unprofiled.get_connection(read_only=True) as conn:
+        conn.execute("select count(*) from trips").fetchone()
+
+    assert conn.profile.to_metadata() == {}
@@ -0,0 +1,78 @@
+import json
+import os
+
+import dagster as dg
+import pytest
+
+from dagster_and_dbt.defs import sensors
+
+
+@pytest.fixture()
+def requests_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sensors, "PATH_TO_REQUESTS", str(tmp_path))
+    monkeypatch.setattr(sensors, "MAX_REQUESTS_PER_TICK", 2)
+    return tmp_path
+
+
+def _write_request(requests_dir, filename, last_modified):
+    file_path = requests_dir / filename
+    file_path.write_text(
+        json.dumps(
+            {"borough": "Queens", "start_date": "2023-01-01", "end_date": "2023-01-08"}
+        )
+    )
+    os.utime(file_path, (last_modified, last_modified))
+
+
+def _tick(cursor=None):
+    result = sensors.adhoc_request_sensor(dg.build_sensor_context(cursor=cursor))
+    filenames = [
+        request["filename"]
+        for run_request in result.run_requests
+        for request in run_request.run_config["ops"]["adhoc_request"]["config"][
+            "requests"
+        ]
+    ]
+    return filenames, result.cursor
+
+
+def test_adhoc_request_sensor_bounded_cursor(requests_dir):
+    _write_request(requests_dir, "b.json", 100)
+    _write_request(requests_dir, "a.json", 100)
+    _write_request(requests_dir, "c.json", 200)
+    (requests_dir / "README.md").write_text("not a request")
+
+    # At most two requests per tick, oldest first
+    filenames, cursor = _tick()
+    assert filenames == ["a.json", "b.json"]
+    assert json.loads(cursor) == {"mtime": 100, "names": ["a.json", "b.json"]}
+
+    filenames, cursor = _tick(cursor)
+    assert filenames == ["c.json"]
+    assert json.loads(cursor) == {"mtime": 200, "names": ["c.json"]}
+
+    filenames, cursor = _tick(cursor)
+    assert filenames == []
+
+    # A modified request is picked up again
+    _write_request(requests_dir, "a.json", 300)
+    filenames, cursor = _tick(cursor)
+    assert filenames == ["a.json"]
+    assert json.loads(cursor) == {"mtime": 300, "names": ["a.json"]}
+
+
+def test_adhoc_request_sensor_migrates_cursor_of_every_file(requests_dir):
+    _write_request(requests_dir, "a.json", 100)
+    _write_request(requests_dir, "b.json", 200)
+    _write_request(requests_dir, "c.json", 200)
+
+    # Earlier versions of the sensor stored the modification time of every processed file
+    filenames, cursor = _tick(json.dumps({"a.json": 100, "b.json": 200}))
+    assert filenames == ["c.json"]
+    assert json.loads(cursor) == {"mtime": 200, "names": ["b.json", "c.json"]}
+
+
+def test_adhoc_request_sensor_skips_without_directory(requests_dir, monkeypatch):
+    monkeypatch.setattr(sensors, "PATH_TO_REQUESTS", str(requests_dir / "missing"))
+    result = sensors.adhoc_request_sensor(dg.build_sensor_context())
+    assert isinstance(result, dg.SkipReason)
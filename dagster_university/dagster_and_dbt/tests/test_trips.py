@@ -0,0 +1,61 @@
+import duckdb
+import pandas as pd
+import pytest
+
+from dagster_and_dbt.defs.assets import trips
+
+
+def _write_raw_trips(path, month, num_rows):
+    pickup = pd.date_range(f"{month}-01", periods=num_rows, freq="h")
+    pd.DataFrame(
+        {
+            "VendorID": 1,
+            "PULocationID": 1,
+            "DOLocationID": 2,
+            "RatecodeID": 1.0,
+            "payment_type": 1,
+            "tpep_dropoff_datetime": pickup + pd.Timedelta(minutes=10),
+            "tpep_pickup_datetime": pickup,
+            "trip_distance": 1.5,
+            "passenger_count": 1.0,
+            "total_amount": 10.0,
+        }
+    ).sample(frac=1, random_state=0).to_parquet(path)
+
+
+@pytest.fixture()
+def raw_trips(tmp_path):
+    paths = {}
+    for month, num_rows in [("2023-01", 48), ("2023-02", 24)]:
+        paths[month] = str(tmp_path / f"taxi_trips_{month}.parquet")
+        _write_raw_trips(paths[month], month, num_rows)
+    return paths
+
+
+def _pickup_times_in_storage_order(conn, partition_date="%"):
+    return [
+        pickup_datetime
+        for (pickup_datetime,) in conn.execute(
+            "select pickup_datetime from trips where partition_date like ? order by rowid",
+            [partition_date],
+        ).fetchall()
+    ]
+
+
+def test_load_trips_partition_sorts_on_pickup(raw_trips):
+    conn = duckdb.connect()
+    for month in ["2023-02", "2023-01", "2023-02"]:
+        trips.load_trips_partition(conn, raw_trips[month], month)
+
+    assert conn.execute(
+        "select partition_date, count(*) from trips group by all order by 1"
+    ).fetchall() == [("2023-01", 48), ("2023-02", 24)]
+
+    for month in raw_trips:
+        pickup_times = _pickup_times_in_storage_order(conn, month)
+        assert pickup_times == sorted(pickup_times)
+
+    trips.cluster_trips(conn)
+    pickup_times = _pickup_times_in_storage_order(conn)
+    assert len(pickup_times) == 72
+    assert pickup_times == sorted(pickup_times)
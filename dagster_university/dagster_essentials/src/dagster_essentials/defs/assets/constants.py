@@ -1,5 +1,6 @@
 TAXI_ZONES_FILE_PATH = "data/raw/taxi_zones.csv"
 TAXI_TRIPS_TEMPLATE_FILE_PATH = "data/raw/taxi_trips_{}.parquet"
+DOWNLOAD_CACHE_DIRECTORY_PATH = "data/raw/.cache"
 
 TRIPS_BY_AIRPORT_FILE_PATH = "data/outputs/trips_by_airport.csv"
 TRIPS_BY_WEEK_FILE_PATH = "data/outputs/trips_by_week.csv"
@@ -0,0 +1,148 @@
+# src/dagster_essentials/defs/assets/downloads.py
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+import requests
+
+from dagster_essentials.defs.assets import constants
+
+# Size of each chunk written to disk while streaming a download
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 60
+
+
+def _write_response(response: requests.Response, file_path: str, chunk_size: int) -> int:
+    """
+      Writes the body of a streamed response to a temporary file next to `file_path` and renames it
+      into place once complete, so readers never see a partially written file.
+    """
+    directory = os.path.dirname(file_path) or "."
+    num_bytes = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                tmp_file.write(chunk)
+                num_bytes += len(chunk)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return num_bytes
+
+
+def stream_to_file(url: str, file_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> int:
+    """
+      Streams the response body of `url` to `file_path` in chunks of `chunk_size` bytes.
+      Returns the number of bytes written.
+    """
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        return _write_response(response, file_path, chunk_size)
+
+
+def _cache_entry_path(url: str, pending: bool = False) -> str:
+    # One small file per URL, so concurrent downloads never rewrite each other's entries
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    suffix = ".pending.json" if pending else ".json"
+    return os.path.join(constants.DOWNLOAD_CACHE_DIRECTORY_PATH, key + suffix)
+
+
+def _read_cache_entry(url: str, file_path: str) -> Optional[dict]:
+    """
+      The cached validators for `url`, if the file they describe is still on disk unchanged.
+    """
+    try:
+        with open(_cache_entry_path(url)) as cache_file:
+            entry = json.load(cache_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if entry.get("file_path") != file_path or not os.path.exists(file_path):
+        return None
+    if os.path.getsize(file_path) != entry.get("num_bytes"):
+        return None
+
+    return entry
+
+
+def _write_cache_entry(url: str, file_path: str, num_bytes: int, response: requests.Response) -> None:
+    entry = {
+        "url": url,
+        "file_path": file_path,
+        "num_bytes": num_bytes,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    if entry["etag"] is None and entry["last_modified"] is None:
+        return
+
+    os.makedirs(constants.DOWNLOAD_CACHE_DIRECTORY_PATH, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=constants.DOWNLOAD_CACHE_DIRECTORY_PATH, suffix=".part")
+    with os.fdopen(fd, "w") as tmp_file:
+        json.dump(entry, tmp_file)
+    os.replace(tmp_path, _cache_entry_path(url, pending=True))
+
+
+def commit_cache_entry(url: str) -> None:
+    """
+      Makes the validators of the last download of `url` the ones sent by the next download.
+      Called once the downloaded file is loaded, so a failed load gets the file downloaded again.
+    """
+    try:
+        os.replace(_cache_entry_path(url, pending=True), _cache_entry_path(url))
+    except FileNotFoundError:
+        pass
+
+
+def is_loaded(url: str) -> bool:
+    """
+      Whether the last download of `url` was loaded: its validators were committed, and no newer
+      download is waiting for `commit_cache_entry`.
+      A file from a server that sends neither ETag nor Last-Modified is never known to be loaded.
+    """
+    return not os.path.exists(_cache_entry_path(url, pending=True)) and os.path.exists(_cache_entry_path(url))
+
+
+def stream_to_file_if_modified(
+    url: str, file_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE, force_download: bool = False
+) -> Optional[int]:
+    """
+      Like `stream_to_file`, but sends the ETag and Last-Modified values cached from the previous
+      download of `url` as `If-None-Match` and `If-Modified-Since`, unless `force_download` is set.
+      The validators of this download are only sent once `commit_cache_entry` is called.
+
+      Returns the number of bytes written, or None if the server answered 304 Not Modified and the
+      file on disk was left untouched.
+    """
+    headers = {}
+    entry = None if force_download else _read_cache_entry(url, file_path)
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    with requests.get(url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+        if response.status_code == requests.codes.not_modified:
+            return None
+
+        response.raise_for_status()
+        num_bytes = _write_response(response, file_path, chunk_size)
+
+    _write_cache_entry(url, file_path, num_bytes, response)
+    return num_bytes
+
+
+def parquet_num_rows(file_path: str) -> int:
+    """
+      The number of rows in a parquet file, read from its footer metadata without loading any data.
+    """
+    import pyarrow.parquet as pq
+
+    return pq.ParquetFile(file_path).metadata.num_rows
@@ -2,18 +2,20 @@
 import dagster as dg
 from dagster_duckdb import DuckDBResource
 
-import matplotlib.pyplot as plt
-import geopandas as gpd
-
 import os
 
 from dagster_essentials.defs.assets import constants
 from dagster_essentials.defs.partitions import weekly_partition
 
 @dg.asset(
-    deps=["taxi_trips", "taxi_zones"]
+    deps=["taxi_trips", "taxi_zones"],
+    io_manager_key="arrow_io_manager",
 )
-def manhattan_stats(context, database: DuckDBResource) -> None:
+def manhattan_stats(context, database: DuckDBResource):
+    """
+      The number of trips per taxi zone in Manhattan, with the zone geometries as WKT.
+      Stored as Arrow by the 'arrow_io_manager', so the result goes from DuckDB to 'manhattan_map' without a pandas or GeoJSON round-trip.
+    """
     query = """
         select
             zones.zone,
@@ -28,26 +30,21 @@ def manhattan_stats(context, database: DuckDBResource) -> None:
 
     with database.get_connection() as conn:
       context.log.info("Running query to create join 'trips' and 'zones' table")
-      trips_by_zone = conn.execute(query).fetch_df()
+      trips_by_zone = conn.execute(query).fetch_arrow_table()
 
-    # trips_by_zone is the result of query joining trips and zones tables
-    #trips_by_zone = conn.execute(query).fetch_df()
+    return trips_by_zone
 
-    # Creating GeoPandas dataframe from trips_by_zone
-    trips_by_zone["geometry"] = gpd.GeoSeries.from_wkt(trips_by_zone["geometry"])
-    trips_by_zone = gpd.GeoDataFrame(trips_by_zone)
+@dg.asset()
+def manhattan_map(manhattan_stats) -> None:
+    # Imported here rather than at the top, so loading the definitions doesn't import them
+    import geopandas as gpd
+    import matplotlib.pyplot as plt
 
-    with open(constants.MANHATTAN_STATS_FILE_PATH, 'w') as output_file:
-        output_file.write(trips_by_zone.to_json())
-
-    
-    context.log.info("Saved Geopandas DataFrame to path")
-
-@dg.asset(
-    deps=["manhattan_stats"],
-)
-def manhattan_map() -> None:
-    trips_by_zone = gpd.read_file(constants.MANHATTAN_STATS_FILE_PATH)
+    # Creating GeoPandas dataframe straight from the memory-mapped Arrow columns of 'manhattan_stats'
+    trips_by_zone = gpd.GeoDataFrame(
+        {"num_trips": manhattan_stats.column("num_trips").to_numpy()},
+        geometry=gpd.GeoSeries.from_wkt(manhattan_stats.column("geometry")),
+    )
 
     fig, ax = plt.subplots(figsize=(10, 10))
     trips_by_zone.plot(column="num_trips", cmap="plasma", legend=True, ax=ax, edgecolor="black")
@@ -61,23 +58,32 @@ def manhattan_map() -> None:
     plt.close(fig)
 
 
-@dg.asset(deps=["taxi_trips"], partitions_def = weekly_partition)
-def trips_by_week(context, database: DuckDBResource) -> None:
-    file_path = constants.TRIPS_BY_WEEK_FILE_PATH
+@dg.asset(
+    deps=["taxi_trips"],
+    partitions_def=weekly_partition,
+    io_manager_key="arrow_io_manager",
+)
+def trips_by_week(context, database: DuckDBResource):
+    """
+      The number of trips, passengers, fares and distance of each week.
+      Stored as Arrow by the 'arrow_io_manager', one file per week, so downstream assets load every week without parsing a CSV.
+    """
     partition_week_str = context.partition_key
 
     query = f'''
         SELECT
-            DATE_TRUNC('week' ,pickup_datetime) as period
+            '{partition_week_str}'::date as period
             , COUNT(vendor_id) as num_trips
             , SUM(passenger_count) as passenger_count
             , SUM(total_amount) as total_amount
             , SUM(trip_distance) as trip_distance
         FROM TRIPS
-        WHERE DATE_TRUNC('week' ,pickup_datetime) = '{partition_week_str}'
-        GROUP BY period
+        WHERE pickup_datetime >= '{partition_week_str}'
+            AND pickup_datetime < '{partition_week_str}'::date + INTERVAL '1 week'
     '''
 
     with database.get_connection() as conn:
-      context.log.info("Running query to copy TRIPS table aggregated by week to csv")
-      conn.execute(f"COPY ({query}) TO '{file_path}' (HEADER, DELIMITER ',');")
\ No newline at end of file
+      context.log.info("Running query to aggregate TRIPS table by week")
+      trips_by_week = conn.execute(query).fetch_arrow_table()
+
+    return trips_by_week
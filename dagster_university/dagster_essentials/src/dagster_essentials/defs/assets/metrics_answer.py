@@ -4,7 +4,6 @@ from dagster._utils.backoff import backoff
 from dagster_essentials.defs.assets import constants
 
 from datetime import datetime, timedelta
-import pandas as pd
 
 import duckdb
 import os
@@ -13,6 +12,9 @@ import os
     deps=["taxi_trips"]
 )
 def trips_by_week_answer_from_uni() -> None:
+    # Imported here rather than at the top, so loading the definitions doesn't import it
+    import pandas as pd
+
     conn = backoff(
         fn=duckdb.connect,
         retry_on=(RuntimeError, duckdb.IOException),
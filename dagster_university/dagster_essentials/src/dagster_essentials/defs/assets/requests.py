@@ -4,8 +4,6 @@ import dagster as dg
 import dagster as dg
 from dagster_duckdb import DuckDBResource
 
-import matplotlib.pyplot as plt
-
 from dagster_essentials.defs.assets import constants
 
 class AdhocRequestConfig(dg.Config):
@@ -18,6 +16,9 @@ class AdhocRequestConfig(dg.Config):
     deps=["taxi_zones", "taxi_trips"]
 )
 def adhoc_request(config: AdhocRequestConfig, database: DuckDBResource) -> None:
+    # Imported here rather than at the top, so loading the definitions doesn't import it
+    import matplotlib.pyplot as plt
+
     file_path = constants.REQUEST_DESTINATION_TEMPLATE_FILE_PATH.format(config.filename.split('.')[0])
 
     query = f"""
@@ -1,65 +1,262 @@
 # src/dagster_essentials/defs/assets/trips.py
 import os
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Optional
+
 import dagster as dg
 from dagster_duckdb import DuckDBResource
-import requests
-from dagster_essentials.defs.assets import constants
+
+from dagster_essentials.defs.assets import constants, downloads
 from dagster_essentials.defs.partitions import monthly_partition
 
-# Asset that fetches taxi trip data from NYC Open Data Portal API 
+
+class TaxiTripsFileConfig(dg.Config):
+    # Number of months downloaded at the same time when a run covers several partitions
+    max_concurrent_downloads: int = 4
+    # Download every month again, even if the cached copy is still current
+    force_download: bool = False
+
+
+def taxi_trips_url(month_to_fetch: str) -> str:
+    return f"https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{month_to_fetch}.parquet"
+
+
+def download_taxi_trips_month(month_to_fetch: str, force_download: bool = False) -> Optional[tuple[int, int]]:
+    """
+      Downloads the taxi trips parquet file for a single month, returning its row count and size in bytes.
+      Returns None if the file on disk is already the current version.
+    """
+    file_path = constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch)
+    url = taxi_trips_url(month_to_fetch)
+
+    # Stream the data from NYC Open Data Portal to disk, so the file is never held in memory
+    num_bytes = downloads.stream_to_file_if_modified(url, file_path, force_download=force_download)
+    if num_bytes is None:
+        return None
+
+    # The row count comes from the parquet footer, so no data is read back
+    return downloads.parquet_num_rows(file_path), num_bytes
+
+
+# Asset that fetches taxi trip data from NYC Open Data Portal API
 @dg.asset(
-        partitions_def = monthly_partition
+    partitions_def=monthly_partition,
+    backfill_policy=dg.BackfillPolicy.single_run(),
+    output_required=False,
 )
-def taxi_trips_file(context) -> None:
+def taxi_trips_file(context, config: TaxiTripsFileConfig):
     """
       The raw parquet files for the taxi trips dataset. Sourced from the NYC Open Data portal.
+      Backfills run as a single run that downloads the months concurrently.
+      If no month changed since it was last downloaded, nothing is materialized and 'taxi_trips' is skipped.
     """
-    
-    partition_date_str = context.partition_key
-    month_to_fetch = partition_date_str[:-3]
-    file_path = constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch)
+    months_to_fetch = [partition_key[:-3] for partition_key in context.partition_keys]
+
+    with ThreadPoolExecutor(max_workers=config.max_concurrent_downloads) as executor:
+        results = list(
+            executor.map(
+                lambda month: download_taxi_trips_month(month, config.force_download),
+                months_to_fetch,
+            )
+        )
 
-    # Request the data from NYC Open Data Portal
-    raw_trips = requests.get(
-        f"https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_{month_to_fetch}.parquet"
+    downloaded = [result for result in results if result is not None]
+    if not downloaded:
+        context.log.info("Taxi trip files are unchanged, skipping the reload")
+        return
+
+    context.log.info(f"Saved {len(downloaded)} taxi trip file(s) to path")
+
+    yield dg.MaterializeResult(
+        metadata={
+            "Number of records": dg.MetadataValue.int(sum(num_rows for num_rows, _ in downloaded)),
+            "Size (bytes)": dg.MetadataValue.int(sum(num_bytes for _, num_bytes in downloaded)),
+            "Months": dg.MetadataValue.int(len(months_to_fetch)),
+            "Unchanged months": dg.MetadataValue.int(len(months_to_fetch) - len(downloaded)),
+        }
     )
-    raw_trips.raise_for_status()
 
-    with open(file_path, "wb") as output_file_trip:
-        output_file_trip.write(raw_trips.content)
 
-    context.log.info("Saved taxi trip file to path")
+class TripsStorageMode(str, Enum):
+    # rows are deleted and re-inserted into a single 'trips' table
+    TABLE = "table"
+    # each month is a table of its own that is swapped in whole, behind a 'trips' view
+    PARTITION_TABLES = "partition_tables"
+    # 'trips' is a view over the raw parquet files, nothing is copied into DuckDB
+    PARQUET_VIEW = "parquet_view"
+
+
+class TaxiTripsConfig(dg.Config):
+    # Switching modes replaces the 'trips' object, so backfill every month after changing it
+    storage_mode: TripsStorageMode = TripsStorageMode.TABLE
+    # Load every month of the run, even those whose file is unchanged since it was last loaded
+    reload_unchanged: bool = False
+
+
+TRIPS_PARTITION_TABLE_PREFIX = "trips_partition_"
+
+
+def select_trips(source: str, partition_date: str) -> str:
+    """
+      A query selecting the columns of 'trips' from a raw taxi trips parquet source.
+    """
+    return f"""
+        select
+          VendorID::integer as vendor_id,
+          PULocationID::integer as pickup_zone_id,
+          DOLocationID::integer as dropoff_zone_id,
+          RatecodeID::double as rate_code_id,
+          payment_type::integer as payment_type,
+          tpep_dropoff_datetime::timestamp as dropoff_datetime,
+          tpep_pickup_datetime::timestamp as pickup_datetime,
+          trip_distance::double as trip_distance,
+          passenger_count::double as passenger_count,
+          total_amount::double as total_amount,
+          {partition_date} as partition_date
+        from {source}
+    """
+
+
+def _trips_object_type(conn) -> Optional[str]:
+    result = conn.execute(
+        "select table_type from information_schema.tables where table_name = 'trips'"
+    ).fetchone()
+    return result[0] if result else None
+
+
+def _loaded_months(conn, storage_mode: TripsStorageMode) -> set[str]:
+    """
+      The months stored in 'trips' with `storage_mode`.
+    """
+    trips_object_type = _trips_object_type(conn)
+
+    if storage_mode == TripsStorageMode.TABLE:
+        if trips_object_type != "BASE TABLE":
+            return set()
+        return {month for (month,) in conn.execute("select distinct partition_date from trips").fetchall()}
+
+    if trips_object_type != "VIEW":
+        return set()
+    partition_tables = conn.execute(f"""
+        select table_name
+        from information_schema.tables
+        where table_name like '{TRIPS_PARTITION_TABLE_PREFIX}%'
+    """).fetchall()
+    return {
+        table_name.removeprefix(TRIPS_PARTITION_TABLE_PREFIX).replace("_", "-")
+        for (table_name,) in partition_tables
+    }
+
+
+def _load_into_table(conn, months_to_fetch: list[str]) -> None:
+    if _trips_object_type(conn) == "VIEW":
+        conn.execute("drop view trips")
+
+    conn.execute("""
+        create table if not exists trips (
+          vendor_id integer, pickup_zone_id integer, dropoff_zone_id integer,
+          rate_code_id double, payment_type integer, dropoff_datetime timestamp,
+          pickup_datetime timestamp, trip_distance double, passenger_count double,
+          total_amount double, partition_date varchar
+        );
+    """)
+
+    for month_to_fetch in months_to_fetch:
+        source = f"'{constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch)}'"
+        conn.execute(f"""
+            delete from trips where partition_date = '{month_to_fetch}';
+
+            insert into trips {select_trips(source, f"'{month_to_fetch}'")};
+        """)
+
+
+def _load_into_partition_tables(conn, months_to_fetch: list[str]) -> None:
+    if _trips_object_type(conn) == "BASE TABLE":
+        conn.execute("drop table trips")
+
+    # Replacing a month's table drops its storage wholesale instead of rewriting row groups
+    for month_to_fetch in months_to_fetch:
+        source = f"'{constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch)}'"
+        partition_table = TRIPS_PARTITION_TABLE_PREFIX + month_to_fetch.replace("-", "_")
+        conn.execute(f"""
+            create or replace table {partition_table} as
+            {select_trips(source, f"'{month_to_fetch}'")};
+        """)
+
+    partition_tables = [
+        table_name
+        for (table_name,) in conn.execute(f"""
+            select table_name
+            from information_schema.tables
+            where table_name like '{TRIPS_PARTITION_TABLE_PREFIX}%'
+            order by table_name
+        """).fetchall()
+    ]
+    union = " union all ".join(f"select * from {table}" for table in partition_tables)
+    conn.execute(f"create or replace view trips as {union};")
+
+
+def _load_into_parquet_view(conn) -> None:
+    if _trips_object_type(conn) == "BASE TABLE":
+        conn.execute("drop table trips")
+
+    # Every downloaded month is picked up by the glob, so reloading a month changes nothing in DuckDB.
+    # The view stores the path as written, so it is made absolute to resolve from any working directory
+    glob = os.path.abspath(constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format("*"))
+    source = f"read_parquet('{glob}', filename = true, union_by_name = true)"
+    partition_date = "regexp_extract(filename, 'taxi_trips_(\\d{4}-\\d{2})\\.parquet$', 1)"
+    conn.execute(f"create or replace view trips as {select_trips(source, partition_date)};")
 
 
 @dg.asset(
-    deps=["taxi_trips_file"], partitions_def = monthly_partition
+    deps=["taxi_trips_file"],
+    partitions_def=monthly_partition,
+    backfill_policy=dg.BackfillPolicy.single_run(),
 )
-def taxi_trips(context, database:DuckDBResource) -> None:
-    partition_date_str = context.partition_key
-    month_to_fetch = partition_date_str[:-3]
+def taxi_trips(context, config: TaxiTripsConfig, database: DuckDBResource) -> None:
     """
-      The raw taxi trips dataset, loaded into a DuckDB database
+      The raw taxi trips dataset, loaded into a DuckDB database.
+      DuckDB allows a single writer, so every month in the run is loaded in one transaction.
+      Months whose file is unchanged since it was last loaded, like those 'taxi_trips_file' got a 304 for, are not loaded again.
+      See `TripsStorageMode` for how the months are stored.
     """
-    query = f"""
-    create table if not exists trips (
-      vendor_id integer, pickup_zone_id integer, dropoff_zone_id integer,
-      rate_code_id double, payment_type integer, dropoff_datetime timestamp,
-      pickup_datetime timestamp, trip_distance double, passenger_count double,
-      total_amount double, partition_date varchar
-    );
-
-    delete from trips where partition_date = '{month_to_fetch}';
-
-    insert into trips
-    select
-      VendorID, PULocationID, DOLocationID, RatecodeID, payment_type, tpep_dropoff_datetime,
-      tpep_pickup_datetime, trip_distance, passenger_count, total_amount, '{month_to_fetch}' as partition_date
-    from '{constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month_to_fetch)}';
-  """
+    months_to_fetch = [partition_key[:-3] for partition_key in context.partition_keys]
 
     with database.get_connection() as conn:
-      context.log.info("Running query to create 'trips' table")
-      conn.execute(query)
+        if config.reload_unchanged or config.storage_mode == TripsStorageMode.PARQUET_VIEW:
+            months_to_load = months_to_fetch
+        else:
+            # A month is loaded again if its file changed, or if it is missing from 'trips', like
+            # after switching storage modes or starting from a new database
+            loaded_months = _loaded_months(conn, config.storage_mode)
+            months_to_load = [
+                month_to_fetch
+                for month_to_fetch in months_to_fetch
+                if month_to_fetch not in loaded_months
+                or not downloads.is_loaded(taxi_trips_url(month_to_fetch))
+            ]
+
+        context.log.info(
+            f"Loading {len(months_to_load)} of {len(months_to_fetch)} month(s) into 'trips' "
+            f"with the '{config.storage_mode.value}' storage mode"
+        )
+
+        conn.begin()
+        try:
+            if config.storage_mode == TripsStorageMode.PARTITION_TABLES:
+                _load_into_partition_tables(conn, months_to_load)
+            elif config.storage_mode == TripsStorageMode.PARQUET_VIEW:
+                _load_into_parquet_view(conn)
+            else:
+                _load_into_table(conn, months_to_load)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Recorded only once loaded, so after a failed load the months are downloaded and loaded again
+    for month_to_fetch in months_to_load:
+        downloads.commit_cache_entry(taxi_trips_url(month_to_fetch))
 
-    #conn.close()
-    #context.log.info("Finished loading taxi trips into DuckDB")
\ No newline at end of file
+    context.log.info(f"Loaded {len(months_to_load)} month(s) into 'trips'")
@@ -2,23 +2,36 @@
 import os
 import dagster as dg
 from dagster_duckdb import DuckDBResource
-import requests
-from dagster_essentials.defs.assets import constants
+from dagster_essentials.defs.assets import constants, downloads
 
-@dg.asset
-def taxi_zones_file(context) -> None:
+TAXI_ZONES_URL = "https://community-engineering-artifacts.s3.us-west-2.amazonaws.com/dagster-university/data/taxi_zones.csv"
+
+
+class TaxiZonesFileConfig(dg.Config):
+    # Download the file again, even if the cached copy is still current
+    force_download: bool = False
+
+
+@dg.asset(output_required=False)
+def taxi_zones_file(context, config: TaxiZonesFileConfig):
     """
-      The raw parquet files for the taxi trips dataset. Sourced from the NYC Open Data portal.
+      The raw CSV file for the taxi zones dataset. Sourced from the NYC Open Data portal.
+      If the file is unchanged since it was last downloaded, nothing is materialized and 'taxi_zones' is skipped.
     """
-    raw_zones = requests.get(
-        "https://community-engineering-artifacts.s3.us-west-2.amazonaws.com/dagster-university/data/taxi_zones.csv"
+    num_bytes = downloads.stream_to_file_if_modified(
+        TAXI_ZONES_URL, constants.TAXI_ZONES_FILE_PATH, force_download=config.force_download
     )
 
-    with open(constants.TAXI_ZONES_FILE_PATH, "wb") as output_file_zone:
-        output_file_zone.write(raw_zones.content)
+    if num_bytes is None:
+        context.log.info("Taxi zone file is unchanged, skipping the reload")
+        return
 
     context.log.info("Saved taxi zone file to path")
 
+    yield dg.MaterializeResult(
+        metadata={"Size (bytes)": dg.MetadataValue.int(num_bytes)}
+    )
+
 
 @dg.asset(
     deps=["taxi_zones_file"]
@@ -42,5 +55,8 @@ def taxi_zones(context, database: DuckDBResource) -> None:
       context.log.info("Running query to create 'zones' table")
       conn.execute(query)
 
+    # Recorded only once loaded, so after a failed load the file is downloaded and loaded again
+    downloads.commit_cache_entry(TAXI_ZONES_URL)
+
     #conn.close()
     #context.log.info("Finished loading taxi zones into DuckDB")
\ No newline at end of file
@@ -1,11 +1,68 @@
  # src/dagster_essentials/defs/resources.py
+import os
+from typing import TYPE_CHECKING
+
 from dagster_duckdb import DuckDBResource
 import dagster as dg
 
+# pyarrow is imported by the methods using it, so that loading the definitions doesn't import it
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 database_resource = DuckDBResource(
     database=dg.EnvVar("DUCKDB_DATABASE")
 )
 
+
+class ArrowIPCIOManager(dg.ConfigurableIOManager):
+    """
+      Stores Arrow tables as uncompressed Arrow IPC files (Feather v2), one file per asset partition.
+      Inputs are memory-mapped, so downstream assets read the columns in place, without copying or parsing them.
+    """
+    base_dir: str = "data/staging/arrow"
+
+    def _path(self, asset_key: dg.AssetKey, partition_key=None) -> str:
+        path = os.path.join(self.base_dir, *asset_key.path)
+        if partition_key is not None:
+            path = os.path.join(path, partition_key)
+        return path + ".arrow"
+
+    def handle_output(self, context: dg.OutputContext, obj: "pa.Table") -> None:
+        import pyarrow as pa
+
+        partition_key = context.partition_key if context.has_partition_key else None
+        path = self._path(context.asset_key, partition_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Written next to the destination then renamed, so a reader never maps a partial file
+        with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, obj.schema) as writer:
+            writer.write_table(obj)
+        os.replace(path + ".tmp", path)
+
+        context.add_output_metadata({
+            "Number of records": dg.MetadataValue.int(obj.num_rows),
+            "Size (bytes)": dg.MetadataValue.int(os.path.getsize(path)),
+            "path": dg.MetadataValue.path(path),
+        })
+
+    def load_input(self, context: dg.InputContext) -> "pa.Table":
+        import pyarrow as pa
+
+        partition_keys = context.asset_partition_keys if context.has_asset_partitions else [None]
+
+        tables = []
+        for partition_key in partition_keys:
+            # The table keeps the mapped memory alive, the file handle itself is closed right away
+            with pa.memory_map(self._path(context.asset_key, partition_key)) as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+
+        # Concatenating keeps each partition's columns as chunks, so nothing is copied either
+        return pa.concat_tables(tables)
+
+
+arrow_io_manager = ArrowIPCIOManager()
+
+
 @dg.definitions
 def resources():
-    return dg.Definitions(resources={"database": database_resource})
\ No newline at end of file
+    return dg.Definitions(resources={"database": database_resource, "arrow_io_manager": arrow_io_manager})
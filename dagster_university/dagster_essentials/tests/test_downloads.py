@@ -0,0 +1,98 @@
+import functools
+import http.server
+import os
+import threading
+
+import pandas as pd
+import pytest
+import requests
+
+from dagster_essentials.defs.assets import downloads
+
+
+@pytest.fixture()
+def file_server(tmp_path):
+    """Serve `tmp_path / "served"` over HTTP on a random local port"""
+    served = tmp_path / "served"
+    served.mkdir()
+
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=str(served)
+    )
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield served, f"http://127.0.0.1:{server.server_address[1]}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_stream_to_file(file_server, tmp_path):
+    served, base_url = file_server
+    pd.DataFrame({"trip": range(1000)}).to_parquet(served / "trips.parquet")
+
+    file_path = tmp_path / "trips.parquet"
+    num_bytes = downloads.stream_to_file(
+        f"{base_url}/trips.parquet", str(file_path), chunk_size=64
+    )
+
+    assert num_bytes == (served / "trips.parquet").stat().st_size
+    assert file_path.read_bytes() == (served / "trips.parquet").read_bytes()
+    assert downloads.parquet_num_rows(str(file_path)) == 1000
+    assert list(tmp_path.glob("*.part")) == []
+
+
+def test_stream_to_file_keeps_existing_file_on_error(file_server, tmp_path):
+    _, base_url = file_server
+
+    file_path = tmp_path / "trips.parquet"
+    file_path.write_bytes(b"previous")
+
+    with pytest.raises(requests.HTTPError):
+        downloads.stream_to_file(f"{base_url}/missing.parquet", str(file_path))
+
+    assert file_path.read_bytes() == b"previous"
+    assert list(tmp_path.glob("*.part")) == []
+
+
+def test_stream_to_file_if_modified(file_server, tmp_path, monkeypatch):
+    served, base_url = file_server
+    (served / "taxi_zones.csv").write_text("LocationID,zone\n1,Newark Airport\n")
+    monkeypatch.chdir(tmp_path)
+
+    url = f"{base_url}/taxi_zones.csv"
+    file_path = str(tmp_path / "taxi_zones.csv")
+
+    assert downloads.stream_to_file_if_modified(url, file_path) == 33
+    # Until the download is committed, the file is downloaded again, as if its load had failed
+    assert downloads.stream_to_file_if_modified(url, file_path) == 33
+
+    downloads.commit_cache_entry(url)
+    # The server answers 304 Not Modified, so the file is not rewritten
+    assert downloads.stream_to_file_if_modified(url, file_path) is None
+
+    # A missing local copy invalidates the cached validators
+    os.remove(file_path)
+    assert downloads.stream_to_file_if_modified(url, file_path) == 33
+    assert os.path.exists(file_path)
+
+
+def test_forced_download_records_validators(file_server, tmp_path, monkeypatch):
+    served, base_url = file_server
+    (served / "taxi_zones.csv").write_text("LocationID,zone\n1,Newark Airport\n")
+    monkeypatch.chdir(tmp_path)
+
+    url = f"{base_url}/taxi_zones.csv"
+    file_path = str(tmp_path / "taxi_zones.csv")
+
+    assert downloads.stream_to_file_if_modified(url, file_path) == 33
+    downloads.commit_cache_entry(url)
+    assert downloads.is_loaded(url)
+
+    # A forced download ignores the cached validators, and records its own once committed
+    assert downloads.stream_to_file_if_modified(url, file_path, force_download=True) == 33
+    assert not downloads.is_loaded(url)
+    downloads.commit_cache_entry(url)
+    assert downloads.stream_to_file_if_modified(url, file_path) is None
@@ -0,0 +1,147 @@
+import os
+
+import dagster as dg
+import pyarrow as pa
+import pytest
+from dagster_duckdb import DuckDBResource
+
+from dagster_essentials.defs.assets import constants, metrics
+from dagster_essentials.defs.resources import ArrowIPCIOManager
+
+daily_partition = dg.DailyPartitionsDefinition(start_date="2023-01-01", end_date="2023-01-04")
+
+
+@dg.asset(partitions_def=daily_partition, io_manager_key="arrow_io_manager")
+def daily_numbers(context) -> pa.Table:
+    return pa.table({"day": [context.partition_key] * 2, "value": [1, 2]})
+
+
+@dg.asset(io_manager_key="arrow_io_manager")
+def all_numbers(daily_numbers: pa.Table) -> pa.Table:
+    return daily_numbers
+
+
+def test_arrow_io_manager_round_trips_partitions(tmp_path):
+    io_manager = ArrowIPCIOManager(base_dir=str(tmp_path))
+
+    for partition_key in daily_partition.get_partition_keys():
+        result = dg.materialize(
+            assets=[daily_numbers],
+            resources={"arrow_io_manager": io_manager},
+            partition_key=partition_key,
+        )
+        assert result.success
+
+    result = dg.materialize(
+        assets=[daily_numbers, all_numbers],
+        resources={"arrow_io_manager": io_manager},
+        selection=[all_numbers],
+    )
+    assert result.success
+
+    metadata = result.asset_materializations_for_node("all_numbers")[0].metadata
+    assert metadata["Number of records"].value == 6
+
+    with pa.memory_map(str(tmp_path / "all_numbers.arrow")) as source:
+        table = pa.ipc.open_file(source).read_all()
+    assert table.column("day").to_pylist() == [
+        day for day in daily_partition.get_partition_keys() for _ in range(2)
+    ]
+    assert not os.path.exists(str(tmp_path / "all_numbers.arrow.tmp"))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="lists the open files from /proc")
+def test_arrow_io_manager_closes_the_files_it_loads(tmp_path):
+    io_manager = ArrowIPCIOManager(base_dir=str(tmp_path))
+    dg.materialize(
+        assets=[daily_numbers],
+        resources={"arrow_io_manager": io_manager},
+        partition_key="2023-01-01",
+    )
+
+    context = dg.build_input_context(
+        asset_key=dg.AssetKey("daily_numbers"),
+        asset_partitions_def=daily_partition,
+        asset_partition_key_range=dg.PartitionKeyRange("2023-01-01", "2023-01-01"),
+    )
+    table = io_manager.load_input(context)
+
+    open_files = [os.path.realpath(f"/proc/self/fd/{fd}") for fd in os.listdir("/proc/self/fd")]
+    assert str(tmp_path / "daily_numbers" / "2023-01-01.arrow") not in open_files
+
+    # The file can be replaced while the table is still in use
+    dg.materialize(
+        assets=[daily_numbers],
+        resources={"arrow_io_manager": io_manager},
+        partition_key="2023-01-01",
+    )
+    assert table.column("value").to_pylist() == [1, 2]
+
+
+@pytest.fixture()
+def manhattan_database(tmp_path, monkeypatch):
+    """Run from an empty project directory with a DuckDB database holding trips and zones"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.dirname(constants.MANHATTAN_MAP_FILE_PATH))
+
+    database = DuckDBResource(database=str(tmp_path / "data.duckdb"))
+    with database.get_connection() as conn:
+        conn.execute("""
+            create table zones as
+            select * from (values
+                (1, 'Upper East Side', 'Manhattan', 'POLYGON ((-74 40.72, -73.95 40.72, -73.95 40.76, -74 40.76, -74 40.72))'),
+                (2, 'Harlem', 'Manhattan', 'POLYGON ((-73.95 40.76, -73.92 40.76, -73.92 40.8, -73.95 40.8, -73.95 40.76))'),
+                (3, 'Jamaica Bay', 'Queens', 'POLYGON ((-73.85 40.6, -73.8 40.6, -73.8 40.65, -73.85 40.6))')
+            ) as t(zone_id, zone, borough, geometry)
+        """)
+        conn.execute("""
+            create table trips as
+            select (i % 3 + 1)::integer as pickup_zone_id
+            from range(30) as t(i)
+        """)
+    return database
+
+
+def test_manhattan_map_reads_manhattan_stats_from_arrow(tmp_path, manhattan_database):
+    result = dg.materialize(
+        assets=[metrics.manhattan_stats, metrics.manhattan_map],
+        resources={
+            "database": manhattan_database,
+            "arrow_io_manager": ArrowIPCIOManager(base_dir=str(tmp_path / "arrow")),
+        },
+    )
+    assert result.success
+
+    metadata = result.asset_materializations_for_node("manhattan_stats")[0].metadata
+    assert metadata["Number of records"].value == 2
+    assert os.path.exists(constants.MANHATTAN_MAP_FILE_PATH)
+
+
+def test_trips_by_week_is_stored_as_arrow(tmp_path, manhattan_database):
+    with manhattan_database.get_connection() as conn:
+        conn.execute("""
+            create or replace table trips as
+            select
+                case when i % 4 = 0 then null else 1 end as vendor_id,
+                timestamp '2023-03-06' + to_hours(i) as pickup_datetime,
+                1 as passenger_count,
+                10.0 as total_amount,
+                2.5 as trip_distance
+            from range(10) as t(i)
+        """)
+
+    result = dg.materialize(
+        assets=[metrics.trips_by_week],
+        resources={
+            "database": manhattan_database,
+            "arrow_io_manager": ArrowIPCIOManager(base_dir=str(tmp_path / "arrow")),
+        },
+        partition_key="2023-03-05",
+    )
+    assert result.success
+
+    with pa.memory_map(str(tmp_path / "arrow" / "trips_by_week" / "2023-03-05.arrow")) as source:
+        table = pa.ipc.open_file(source).read_all()
+    assert table.select(["num_trips", "passenger_count", "total_amount"]).to_pylist() == [
+        {"num_trips": 7, "passenger_count": 10, "total_amount": 100.0}
+    ]
@@ -0,0 +1,170 @@
+import os
+
+import dagster as dg
+import pandas as pd
+import pytest
+from dagster_duckdb import DuckDBResource
+
+from dagster_essentials.defs.assets import constants, downloads, trips
+
+
+def _write_raw_trips(month: str, num_rows: int):
+    pickup = pd.date_range(f"{month}-01", periods=num_rows, freq="h")
+    pd.DataFrame(
+        {
+            "VendorID": 1,
+            "PULocationID": 1,
+            "DOLocationID": 2,
+            "RatecodeID": 1.0,
+            "payment_type": 1,
+            "tpep_dropoff_datetime": pickup + pd.Timedelta(minutes=10),
+            "tpep_pickup_datetime": pickup,
+            "trip_distance": 1.5,
+            "passenger_count": 1.0,
+            "total_amount": 10.0,
+        }
+    ).to_parquet(constants.TAXI_TRIPS_TEMPLATE_FILE_PATH.format(month))
+
+
+@pytest.fixture()
+def raw_trips(tmp_path, monkeypatch):
+    """Run from an empty project directory with raw trips files for January and February"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.dirname(constants.TAXI_TRIPS_TEMPLATE_FILE_PATH))
+
+    _write_raw_trips("2023-01", 24)
+    _write_raw_trips("2023-02", 48)
+
+    return DuckDBResource(database=str(tmp_path / "data.duckdb"))
+
+
+def _run_config(storage_mode: str) -> dict:
+    return {"ops": {"taxi_trips": {"config": {"storage_mode": storage_mode}}}}
+
+
+STORAGE_MODES = ["TABLE", "PARTITION_TABLES", "PARQUET_VIEW"]
+
+
+@pytest.mark.parametrize("storage_mode", STORAGE_MODES)
+def test_taxi_trips_loads_partition_range_in_one_run(raw_trips, storage_mode):
+    result = dg.materialize(
+        assets=[trips.taxi_trips],
+        resources={"database": raw_trips},
+        run_config=_run_config(storage_mode),
+        tags={
+            "dagster/asset_partition_range_start": "2023-01-01",
+            "dagster/asset_partition_range_end": "2023-02-01",
+        },
+    )
+    assert result.success
+
+    with raw_trips.get_connection() as conn:
+        counts = conn.execute(
+            "select partition_date, count(*) from trips group by all order by 1"
+        ).fetchall()
+
+    assert counts == [("2023-01", 24), ("2023-02", 48)]
+
+
+@pytest.mark.parametrize("storage_mode", STORAGE_MODES)
+def test_taxi_trips_reload_replaces_partition(raw_trips, storage_mode):
+    for _ in range(2):
+        result = dg.materialize(
+            assets=[trips.taxi_trips],
+            resources={"database": raw_trips},
+            run_config=_run_config(storage_mode),
+            partition_key="2023-02-01",
+        )
+        assert result.success
+
+    with raw_trips.get_connection() as conn:
+        assert conn.execute(
+            "select count(*) from trips where partition_date = '2023-02'"
+        ).fetchone() == (48,)
+
+
+def test_taxi_trips_switches_storage_mode(raw_trips):
+    for storage_mode in [*STORAGE_MODES, "TABLE"]:
+        result = dg.materialize(
+            assets=[trips.taxi_trips],
+            resources={"database": raw_trips},
+            run_config=_run_config(storage_mode),
+            partition_key="2023-01-01",
+        )
+        assert result.success
+
+    with raw_trips.get_connection() as conn:
+        assert conn.execute("select count(*) from trips").fetchone() == (24,)
+
+
+def test_taxi_trips_commits_downloads_once_loaded(raw_trips):
+    url = trips.taxi_trips_url("2023-01")
+    os.makedirs(constants.DOWNLOAD_CACHE_DIRECTORY_PATH)
+    with open(downloads._cache_entry_path(url, pending=True), "w") as entry:
+        entry.write("{}")
+
+    result = dg.materialize(
+        assets=[trips.taxi_trips],
+        resources={"database": raw_trips},
+        partition_key="2023-01-01",
+    )
+    assert result.success
+
+    assert not os.path.exists(downloads._cache_entry_path(url, pending=True))
+    assert os.path.exists(downloads._cache_entry_path(url))
+
+
+def _download(month: str, num_rows: int):
+    """Write a new raw trips file for `month`, waiting to be loaded like a changed download"""
+    _write_raw_trips(month, num_rows)
+    os.makedirs(constants.DOWNLOAD_CACHE_DIRECTORY_PATH, exist_ok=True)
+    with open(downloads._cache_entry_path(trips.taxi_trips_url(month), pending=True), "w") as entry:
+        entry.write("{}")
+
+
+@pytest.mark.parametrize("storage_mode", ["TABLE", "PARTITION_TABLES"])
+def test_taxi_trips_skips_unchanged_months(raw_trips, tmp_path, storage_mode):
+    _download("2023-01", 24)
+    _download("2023-02", 48)
+
+    def materialize(database):
+        result = dg.materialize(
+            assets=[trips.taxi_trips],
+            resources={"database": database},
+            run_config=_run_config(storage_mode),
+            tags={
+                "dagster/asset_partition_range_start": "2023-01-01",
+                "dagster/asset_partition_range_end": "2023-02-01",
+            },
+        )
+        assert result.success
+
+        with database.get_connection() as conn:
+            return conn.execute(
+                "select partition_date, count(*) from trips group by all order by 1"
+            ).fetchall()
+
+    assert materialize(raw_trips) == [("2023-01", 24), ("2023-02", 48)]
+
+    # Only February was downloaded again, January's file got a 304 and is not read
+    _write_raw_trips("2023-01", 12)
+    _download("2023-02", 36)
+    assert materialize(raw_trips) == [("2023-01", 24), ("2023-02", 36)]
+
+    # Months missing from the database are loaded, even if their file is unchanged
+    new_database = DuckDBResource(database=str(tmp_path / "new.duckdb"))
+    assert materialize(new_database) == [("2023-01", 12), ("2023-02", 36)]
+
+
+def test_taxi_trips_parquet_view_reads_from_any_directory(raw_trips, tmp_path, monkeypatch):
+    result = dg.materialize(
+        assets=[trips.taxi_trips],
+        resources={"database": raw_trips},
+        run_config=_run_config("PARQUET_VIEW"),
+        partition_key="2023-01-01",
+    )
+    assert result.success
+
+    monkeypatch.chdir(tmp_path / "data")
+    with raw_trips.get_connection() as conn:
+        assert conn.execute("select count(*) from trips").fetchone() == (72,)